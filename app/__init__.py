@@ -5,6 +5,8 @@ A simple flask app to see when tea is ready to drink in DA.
 /brewed/<tea_name> to add tea
 /drank/ to say the last pot has been drank
 /api/ for the json api
+/api/v1/status/stream for live pot events
+/metrics for Prometheus
 """
 
 from flask import Flask
@@ -16,12 +18,28 @@ from flask.ext.mail import Mail
 from flask.ext.pagedown import PageDown
 from flask.ext.markdown import Markdown
 from config import config
+from .status import StatusCache
+from .hub import Hub
+from .last_seen import LastSeenTracker
+from .outbox import MailOutbox
+from .conditional import TableVersions
+from .query_stats import QueryStats
+from .metrics import Metrics
+from .leaderboard import Leaderboard
 
 bootstrap = Bootstrap()
 moment = Moment()
 db = SQLAlchemy()
 mail = Mail()
+outbox = MailOutbox()
 pagedown = PageDown()
+status_cache = StatusCache()
+hub = Hub()
+last_seen = LastSeenTracker()
+table_versions = TableVersions()
+query_stats = QueryStats()
+metrics = Metrics()
+leaderboard = Leaderboard()
 
 login_manager = LoginManager()
 login_manager.session_protection = 'strong'
@@ -39,7 +57,15 @@ def create_app(config_name):
     db.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    outbox.init_app(app)
     pagedown.init_app(app)
+    status_cache.init_app(app)
+    hub.init_app(app)
+    last_seen.init_app(app)
+    table_versions.init_app(app)
+    query_stats.init_app(app)
+    metrics.init_app(app)
+    leaderboard.init_app(app)
     Markdown(app)
 
     from .main import main as main_blueprint
@@ -1,19 +1,72 @@
-from flask import Blueprint, request, current_app, url_for, jsonify
+from flask import Blueprint, request, current_app, url_for
 from .. import db
+from ..conditional import conditional
+from ..exceptions import ValidationError
+from ..serialize import load_options
+from ..urls import build_url
+from .pagination import keyset_page, ordered
+from .encoding import json_response
 
 api = Blueprint('api', __name__)
 
 
-def api_paginate(endpoint, query, *, tag_name='results', **kwargs):
-    """Helper for any paginated list of results."""
+def api_paginate(endpoint, query, *, tag_name='results', order_by, descending=False,
+                 json_kwargs=None, **kwargs):
+    """
+    Helper for any paginated list of results.
+
+    order_by is a tuple of columns that gives the collection a stable order,
+    it must end with the primary key so that every row has a unique position.
+
+    Asking with ?page= (or nothing) gives numbered pages with a total count.
+    Asking with ?cursor= (empty for the first page) gives keyset pages whose
+    prev and next links carry opaque cursors, which skips the OFFSET scan and
+    the COUNT(*) so that deep pages are as cheap as the first one.
+
+    ?fields= and ?expand= are carried into the prev and next links.
+    json_kwargs are passed on to each item's to_json.
+    """
+    model = query_model(query)
+    not_modified = conditional(model.json_tables)
+    if not_modified:
+        return not_modified
+
+    json_kwargs = json_kwargs or {}
+    per_page = request.args.get('limit', current_app.config['TEAFLASK_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['TEAFLASK_MAX_PER_PAGE']))
+    if 'limit' in request.args:
+        kwargs['limit'] = per_page
+    fields, expand = json_options(model)
+    for name in ('fields', 'expand'):
+        if name in request.args:
+            kwargs[name] = request.args[name]
+    query = query.options(*load_options(model, fields, expand, [c.key for c in order_by]))
+
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        items, prev_cursor, next_cursor = keyset_page(
+            query,
+            order_by,
+            cursor=cursor,
+            per_page=per_page,
+            descending=descending
+        )
+        _prev = None
+        if prev_cursor:
+            _prev = url_for(endpoint, cursor=prev_cursor, _external=True, **kwargs)
+        _next = None
+        if next_cursor:
+            _next = url_for(endpoint, cursor=next_cursor, _external=True, **kwargs)
+        return json_response({
+            tag_name: [item.to_json(fields, expand, **json_kwargs) for item in items],
+            'prev': _prev,
+            'next': _next,
+        })
+
     page = request.args.get('page', 1, type=int)
-    pagination = query.paginate(
+    pagination = ordered(query, order_by, descending).paginate(
         page,
-        per_page=request.args.get(
-            'limit',
-            current_app.config['TEAFLASK_PER_PAGE'],
-            type=int
-        ),
+        per_page=per_page,
         error_out=False
     )
     _prev = None
@@ -22,14 +75,45 @@ def api_paginate(endpoint, query, *, tag_name='results', **kwargs):
     _next = None
     if pagination.has_next:
         _next = url_for(endpoint, page=page + 1, _external=True, **kwargs)
-    return jsonify({
-        tag_name: [item.to_json() for item in pagination.items],
+    return json_response({
+        tag_name: [item.to_json(fields, expand, **json_kwargs) for item in pagination.items],
         'prev': _prev,
         'next': _next,
         'count': pagination.total
     })
 
 
+def query_model(query):
+    """The model class which the query loads."""
+    return query.column_descriptions[0]['type']
+
+
+def json_options(model):
+    """
+    The fields and the relationships to expand asked for by the request.
+
+    ?fields=id,name gives only those fields, and ?expand=tea embeds the tea
+    instead of its url. fields is None when the request asks for the default
+    fields.
+    """
+    fields = None
+    if request.args.get('fields'):
+        fields = request.args['fields'].split(',')
+        unknown = [name for name in fields if name not in model.json_fields]
+        if unknown:
+            raise ValidationError('Unknown fields: ' + ', '.join(unknown))
+    expand = ()
+    if request.args.get('expand'):
+        expand = request.args['expand'].split(',')
+        unknown = [
+            name for name in expand
+            if name not in model.json_fields or not model.json_fields[name].expand
+        ]
+        if unknown:
+            raise ValidationError('Cannot expand: ' + ', '.join(unknown))
+    return fields, expand
+
+
 def api_create(model, **kwargs):
     """A helper for a POST method to create a new model."""
     if not request.json:
@@ -43,15 +127,19 @@ def api_create(model, **kwargs):
     db.session.commit()
 
     endpoint = 'api.get_' + model.__name__.lower()
-    return jsonify(obj.to_json()), 201, {
-        'Location': url_for(endpoint, id=obj.id, _external=True)
+    return json_response(obj.to_json()), 201, {
+        'Location': build_url(endpoint, obj.id)
     }
 
 
-def api_get(model, id_):
-    """A helper to return the json of a single model instance."""
-    obj = model.query.get_or_404(id_)
-    return jsonify(obj.to_json())
+def api_get(model, id_, **json_kwargs):
+    """A helper to return the json of a single model instance, json_kwargs go to its to_json."""
+    not_modified = conditional(model.json_tables)
+    if not_modified:
+        return not_modified
+    fields, expand = json_options(model)
+    obj = model.query.options(*load_options(model, fields, expand)).get_or_404(id_)
+    return json_response(obj.to_json(fields, expand, **json_kwargs))
 
 # Must be below the other code
-from . import authentication, pots, brewers, teas, errors
+from . import authentication, pots, brewers, teas, stats, status, queries, errors
@@ -1,24 +1,154 @@
+import hashlib
+import hmac
+import os
+import time
 from flask import g, request, current_app
-from ..models import Brewer, AnonymousBrewer
+from sqlalchemy.orm import Session, joinedload
+from .. import db
+from ..cache import TTLCache, VersionStamp
+from ..models import Brewer, AnonymousBrewer, Permission
+from ..signals import credentials_changed
 from . import api
-from datetime import datetime, timedelta
+from .decorators import permission_required
 from .errors import unauthorized, forbidden
+from .encoding import json_response
+
+CACHES = ('api_credentials', 'api_tokens', 'api_users')
+
+
+@api.record_once
+def init_auth_caches(state):
+    """
+    Cache verified credentials, verified tokens and the brewers they belong to.
+
+    Hashing the password is most of the cost of an API request for scripted
+    clients which send Basic auth every time, and a cached token and brewer
+    authenticate a request without touching the database at all. The caches
+    share a version stamp so that they are all emptied together.
+    """
+    app = state.app
+    stamp = VersionStamp(os.path.join(app.config['TEAFLASK_STATE_DIR'], 'credentials'))
+    size = app.config['TEAFLASK_CREDENTIAL_CACHE_SIZE']
+    ttl = app.config['TEAFLASK_CREDENTIAL_CACHE_TTL']
+    for name in CACHES:
+        app.extensions[name] = TTLCache(size, ttl, stamp)
+
+
+@credentials_changed.connect
+def invalidate_credentials(app, **kwargs):
+    """Forget every verified password when a password or permission changes."""
+    if app is not None and 'api_credentials' in app.extensions:
+        # the caches share the stamp so the others are emptied on their next get
+        app.extensions['api_credentials'].invalidate()
+
+
+def credentials_key(username, password):
+    """A keyed digest so that the cache never holds a password."""
+    return hmac.new(
+        current_app.config['SECRET_KEY'].encode('utf-8'),
+        '{}\0{}'.format(username, password).encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def fetch_user(**criteria):
+    """
+    Load a brewer and its role in a private session, for the users cache.
+
+    The session is closed, so the brewer is detached with its role loaded.
+    It stays detached: the cached copy is only used to check permissions, and
+    the request's session loads the brewer's current row if a view asks for it.
+    """
+    session = Session(bind=db.engine)
+    try:
+        return session.query(Brewer).options(joinedload('role')).filter_by(**criteria).first()
+    finally:
+        session.close()
+
+
+def load_user(user_id):
+    """Get the brewer of the request, from the cache if possible."""
+    users = current_app.extensions['api_users']
+    user = users.get(user_id)
+    if user is None:
+        user = fetch_user(id=user_id)
+        if user is None:
+            return None
+        users.set(user_id, user)
+    return user
+
+
+def verify_token(token):
+    """Get the brewer for a bearer token, or None if it is not valid."""
+    tokens = current_app.extensions['api_tokens']
+    user_id = tokens.get(token)
+    if user_id is None:
+        token_data = Brewer.read_auth_token(token)
+        if token_data is None:
+            return None
+        user_id, expires = token_data
+        tokens.set(token, user_id, ttl=min(tokens.ttl, expires - time.time()))
+    return load_user(user_id)
 
 
 @api.before_request
 def before_request():
     if current_app.config.get('DEBUG', False):
         return
-    if not g.get('current_user') or (g.current_user and datetime.utcnow() > g.login_expires):
-        auth = request.authorization
-        if auth is None:
-            return forbidden('Use Basic HTTP Auth')
-        user = Brewer.query.filter_by(username=auth.username).first()
-        if not user:
+    g.token_used = False
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        user = verify_token(authorization[len('Bearer '):].strip())
+        if user is None:
             g.user = AnonymousBrewer()
-            return forbidden('Invalid username')
-        if not user.verify_password(auth.password):
-            g.user = AnonymousBrewer()
-            return unauthorized('Invalid Credentials')
+            return unauthorized('Invalid or expired token')
         g.current_user = user
-        g.login_expires = datetime.utcnow() + timedelta(hours=1)
+        g.token_used = True
+        return
+
+    auth = request.authorization
+    if auth is None:
+        return forbidden('Use Basic HTTP Auth or a Bearer token')
+
+    credentials = current_app.extensions['api_credentials']
+    key = credentials_key(auth.username, auth.password)
+    user_id = credentials.get(key)
+    if user_id is not None:
+        user = load_user(user_id)
+        if user is not None:
+            g.current_user = user
+            return
+
+    user = fetch_user(username=auth.username)
+    if not user:
+        g.user = AnonymousBrewer()
+        return forbidden('Invalid username')
+    if not user.verify_password(auth.password):
+        g.user = AnonymousBrewer()
+        return unauthorized('Invalid Credentials')
+    # one login warms both caches
+    credentials.set(key, user.id)
+    current_app.extensions['api_users'].set(user.id, user)
+    g.current_user = user
+
+
+@api.route('/tokens', methods=['POST'])
+def new_token():
+    """Issue a bearer token in exchange for the brewer's password."""
+    if g.get('current_user') is None or g.token_used:
+        return unauthorized('Use Basic HTTP Auth to get a token')
+    expiration = current_app.config['TEAFLASK_TOKEN_EXPIRATION']
+    return json_response({
+        'token': g.current_user.generate_auth_token(expiration),
+        'expiration': expiration,
+    }), 201
+
+
+@api.route('/auth/stats')
+@permission_required(Permission.ADMINISTER)
+def get_auth_stats():
+    """The hit and miss counters of the authentication caches."""
+    return json_response({
+        name[len('api_'):]: current_app.extensions[name].stats()
+        for name in CACHES
+    })
@@ -1,5 +1,12 @@
-from . import api, api_paginate, api_get
+from flask import request
+from .. import leaderboard
+from ..conditional import conditional
+from ..exceptions import ValidationError
+from ..leaderboard import WINDOWS
 from ..models import Brewer, Pot, Role
+from . import api, api_paginate, api_get
+from .encoding import json_response
+from .filters import pot_filters
 
 
 @api.route('/brewers/')
@@ -8,10 +15,31 @@ def get_brewers():
     return api_paginate(
         'api.get_brewers',
         Brewer.query,
-        tag_name='brewers'
+        tag_name='brewers',
+        order_by=(Brewer.id,)
     )
 
 
+@api.route('/brewers/leaderboard')
+def get_leaderboard():
+    """The brewers who brewed the most pots in the ?window= of 7d, 30d or all."""
+    window = request.args.get('window', '7d')
+    if window not in WINDOWS:
+        raise ValidationError('window must be one of ' + ', '.join(sorted(WINDOWS)))
+    since, ranking = leaderboard.get(window)
+    return json_response({
+        'window': window,
+        'since': since,
+        'brewers': [{
+            'rank': rank,
+            'id': id_,
+            'url': Brewer.get_url(id_),
+            'username': username,
+            'pots': pots,
+        } for rank, (pots, id_, username) in enumerate(ranking, 1)],
+    })
+
+
 @api.route('/brewers/<int:id_>/')
 def get_brewer(id_):
     """Get a single brewer."""
@@ -20,19 +48,27 @@ def get_brewer(id_):
 
 @api.route('/brewers/<int:id_>/pots/')
 def get_brewer_pots(id_):
-    """Get the pots brewed by a brewer."""
+    """Get the pots brewed by a brewer, filtered by ?since=, ?until= and ?drinkable=."""
+    not_modified = conditional(Pot.json_tables)
+    if not_modified:
+        return not_modified
     brewer = Brewer.query.get_or_404(id_)
+    criteria, kwargs = pot_filters(request.args)
     return api_paginate(
         'api.get_brewer_pots',
-        brewer.pots.order_by(Pot.brewed_at.desc()),
-        tag_name='pots'
+        brewer.pots.filter(*criteria),
+        tag_name='pots',
+        order_by=(Pot.brewed_at, Pot.id),
+        descending=True,
+        id_=id_,
+        **kwargs
     )
 
 
 @api.route('/roles/')
 def get_roles():
     """Get all of the roles."""
-    return api_paginate('api.get_roles', Role.query, tag_name='roles')
+    return api_paginate('api.get_roles', Role.query, tag_name='roles', order_by=(Role.id,))
 
 
 @api.route('/roles/<int:id_>/')
@@ -47,6 +83,9 @@ def get_role_brewers(id_):
     role = Role.query.get_or_404(id_)
     return api_paginate(
         'api.get_role_brewers',
-        role.brewers.order_by(Brewer.member_since.desc()),
-        tag_name='brewers'
+        role.brewers,
+        tag_name='brewers',
+        order_by=(Brewer.member_since, Brewer.id),
+        descending=True,
+        id_=id_
     )
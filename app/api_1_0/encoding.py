@@ -0,0 +1,45 @@
+"""
+Encoding of the API responses.
+
+orjson is used when it is installed and the standard library json otherwise.
+Datetimes are formatted by the encoder, so to_json can return them as they
+are. Responses are compact unless JSONIFY_PRETTYPRINT_REGULAR is set or the
+app is in debug mode, and indented responses have their keys sorted, so both
+encoders give the same output.
+"""
+
+import json
+from datetime import datetime
+from flask import current_app, Response
+from ..models import DATE_FORMAT
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.strftime(DATE_FORMAT)
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+def dumps(data, indent=False, backend=BACKEND):
+    """Encode data to JSON bytes."""
+    if backend == 'orjson':
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=_default, option=option)
+    if indent:
+        return json.dumps(data, default=_default, indent=2, sort_keys=True).encode('utf-8')
+    return json.dumps(data, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200, headers=None):
+    """A JSON response of the data, to be used instead of jsonify."""
+    indent = current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug
+    return Response(dumps(data, indent), status=status, headers=headers, mimetype='application/json')
@@ -0,0 +1,56 @@
+"""
+Export the pot history as NDJSON or CSV.
+
+The rows are read with a server side cursor, yield_per, and written out a
+batch at a time, so memory use does not grow with the size of the table.
+"""
+
+import csv
+import io
+from .. import db
+from .encoding import dumps
+from ..models import DATE_FORMAT, Brewer, Pot, Tea
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+COLUMNS = ('id', 'brewed_at', 'drank_at', 'tea_id', 'tea_name', 'brewer_id', 'brewer_username')
+
+
+def pot_rows(since=None, until=None, batch_size=1000):
+    """Yield a tuple of COLUMNS for every pot brewed in [since, until)."""
+    query = db.session.query(
+        Pot.id, Pot.brewed_at, Pot.drank_at, Pot.tea_id, Tea.name, Pot.brewer_id, Brewer.username
+    ).outerjoin(Tea, Pot.tea_id == Tea.id).outerjoin(Brewer, Pot.brewer_id == Brewer.id)
+    if since is not None:
+        query = query.filter(Pot.brewed_at >= since)
+    if until is not None:
+        query = query.filter(Pot.brewed_at < until)
+    for row in query.order_by(Pot.id).yield_per(batch_size):
+        yield tuple(
+            value.strftime(DATE_FORMAT) if hasattr(value, 'strftime') else value
+            for value in row
+        )
+
+
+def export_pots(export_format='ndjson', since=None, until=None, batch_size=1000):
+    """Yield the export as chunks of text of up to batch_size rows."""
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(dumps(dict(zip(COLUMNS, row))).decode('utf-8'))
+            buffer.write('\n')
+
+    for count, row in enumerate(pot_rows(since, until, batch_size), 1):
+        write(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
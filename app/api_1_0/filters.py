@@ -0,0 +1,56 @@
+"""Query string filters shared by the API endpoints."""
+
+from datetime import datetime
+from ..exceptions import ValidationError
+from ..models import DATE_FORMAT, Pot
+
+DATE_ONLY_FORMAT = '%Y-%m-%d'
+BOOLEANS = {'true': True, '1': True, 'false': False, '0': False}
+POT_FILTERS = ('since', 'until', 'drinkable')
+
+
+def parse_datetime(value, name):
+    """Parse a filter value given as DATE_FORMAT or a date on its own."""
+    for date_format in (DATE_FORMAT, DATE_ONLY_FORMAT):
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValidationError('{} must be formatted as {} or {}'.format(
+        name, DATE_FORMAT, DATE_ONLY_FORMAT))
+
+
+def time_range(args):
+    """The (since, until) datetimes of the query string, either may be None."""
+    since, until = (
+        parse_datetime(args[name], name) if args.get(name) else None
+        for name in ('since', 'until')
+    )
+    if since and until and until < since:
+        raise ValidationError('until must not be before since')
+    return since, until
+
+
+def pot_filters(args):
+    """
+    The criteria of the pot filters of the query string, and the filters to
+    carry into the prev and next links.
+
+    ?since= and ?until= are ranges of brewed_at, which the (brewed_at, id)
+    indexes serve, alone or after the tea or brewer. ?drinkable=true keeps
+    the pots which have not been drank, from the partial index on them.
+    """
+    since, until = time_range(args)
+    criteria = []
+    if since is not None:
+        criteria.append(Pot.brewed_at >= since)
+    if until is not None:
+        criteria.append(Pot.brewed_at < until)
+    if args.get('drinkable'):
+        if args['drinkable'] not in BOOLEANS:
+            raise ValidationError('drinkable must be true or false')
+        if BOOLEANS[args['drinkable']]:
+            criteria.append(Pot.drank_at == None)  # NOQA
+        else:
+            criteria.append(Pot.drank_at != None)  # NOQA
+    return criteria, {name: args[name] for name in POT_FILTERS if args.get(name)}
@@ -0,0 +1,94 @@
+"""
+Keyset (cursor) pagination for the API collections.
+
+A cursor is the signed, url safe encoding of the ordering values of the last
+(or first) item on a page. Asking for the rows after it is a range scan on the
+ordering index instead of an OFFSET, so deep pages cost the same as the first.
+"""
+
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_
+from .. import db
+from ..exceptions import ValidationError
+
+
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+NEXT = 'n'
+PREV = 'p'
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='api-cursor')
+
+
+def _is_datetime(column):
+    return isinstance(column.property.columns[0].type, db.DateTime)
+
+
+def encode_cursor(order_by, item, direction):
+    """Return the opaque cursor pointing at item in the given direction."""
+    values = []
+    for column in order_by:
+        value = getattr(item, column.key)
+        if value is not None and _is_datetime(column):
+            value = value.strftime(CURSOR_DATE_FORMAT)
+        values.append(value)
+    return _serializer().dumps({'k': values, 'd': direction})
+
+
+def decode_cursor(order_by, cursor):
+    """Return the (values, direction) of a cursor or raise a ValidationError."""
+    try:
+        data = _serializer().loads(cursor)
+        values, direction = data['k'], data['d']
+        if len(values) != len(order_by) or direction not in (NEXT, PREV):
+            raise ValueError(cursor)
+        return [
+            datetime.strptime(value, CURSOR_DATE_FORMAT)
+            if value is not None and _is_datetime(column) else value
+            for column, value in zip(order_by, values)
+        ], direction
+    except (BadSignature, KeyError, TypeError, ValueError):
+        raise ValidationError('Invalid cursor')
+
+
+def after(order_by, values, descending):
+    """The row value comparison (a, b) > (x, y) spelt out for every backend."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(order_by, values)):
+        equal = [c == v for c, v in zip(order_by[:i], values[:i])]
+        clauses.append(and_(*(equal + [column < value if descending else column > value])))
+    return or_(*clauses)
+
+
+def ordered(query, order_by, descending):
+    """Apply the ordering of a collection to the query."""
+    return query.order_by(*[c.desc() if descending else c.asc() for c in order_by])
+
+
+def keyset_page(query, order_by, *, cursor, per_page, descending):
+    """
+    Get one page of a collection after (or before) the cursor.
+
+    Returns (items, prev_cursor, next_cursor) where the cursors are None at
+    either end of the collection.
+    """
+    direction = NEXT
+    if cursor:
+        values, direction = decode_cursor(order_by, cursor)
+        # walking backwards is walking forwards in the reversed ordering
+        query = query.filter(after(order_by, values, descending == (direction == NEXT)))
+    query = ordered(query, order_by, descending == (direction == NEXT))
+    items = query.limit(per_page + 1).all()
+    more = len(items) > per_page
+    items = items[:per_page]
+    if direction == PREV:
+        items.reverse()
+
+    has_prev = more if direction == PREV else bool(cursor)
+    has_next = more if direction == NEXT else True
+    _prev = encode_cursor(order_by, items[0], PREV) if items and has_prev else None
+    _next = encode_cursor(order_by, items[-1], NEXT) if items and has_next else None
+    return items, _prev, _next
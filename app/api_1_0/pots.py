@@ -1,13 +1,45 @@
-from flask import g
-from ..models import Pot, Permission, Brewer
+from flask import g, current_app, request, stream_with_context, Response
+from .. import db
+from ..exceptions import ValidationError
+from ..models import Pot, Permission, Brewer, Tea
 from . import api, api_paginate, api_create, api_get
 from .decorators import permission_required
+from .errors import bad_request
+from .export import FORMATS, export_pots
+from .filters import pot_filters, time_range
+from .encoding import json_response
 
 
 @api.route('/pots/')
 def get_pots():
-    """Get a list of pots."""
-    return api_paginate('api.get_pots', Pot.query, tag_name='pots')
+    """Get a list of pots, filtered by ?since=, ?until= and ?drinkable=."""
+    criteria, kwargs = pot_filters(request.args)
+    return api_paginate(
+        'api.get_pots',
+        Pot.query.filter(*criteria),
+        tag_name='pots',
+        order_by=(Pot.brewed_at, Pot.id),
+        descending=True,
+        **kwargs
+    )
+
+
+@api.route('/pots/export')
+def get_pots_export():
+    """
+    Stream every pot as NDJSON, or CSV with ?format=csv.
+
+    ?since= and ?until= limit the export to the pots brewed in between.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        raise ValidationError('format must be one of ' + ', '.join(sorted(FORMATS)))
+    since, until = time_range(request.args)
+    return Response(
+        stream_with_context(export_pots(export_format, since, until)),
+        mimetype=FORMATS[export_format],
+        headers={'Content-Disposition': 'attachment; filename=pots.' + export_format}
+    )
 
 
 @api.route('/pots/<int:id_>')
@@ -19,5 +51,43 @@ def get_pot(id_):
 @api.route('/pots/', methods=['POST'])
 @permission_required(Permission.BREW)
 def new_pot():
-    """Create a new pot from json."""
-    return api_create(Pot, brewer=g.get('current_user', Brewer.query.get(1)))
+    """Create a new pot from json, or many pots from a json list."""
+    brewer = g.get('current_user', Brewer.query.get(1))
+    if isinstance(request.json, list):
+        return new_pots(request.json, brewer)
+    # by id, the brewer may be a cached copy outside of the session
+    return api_create(Pot, brewer_id=brewer.id)
+
+
+def new_pots(items, brewer):
+    """
+    Validate every pot and insert the valid ones in one transaction.
+
+    The response has a result for each item, in the same order, with a 201
+    or 400 status and the errors of the invalid ones.
+    """
+    if not items:
+        return bad_request('Empty POST body')
+    if len(items) > current_app.config['TEAFLASK_MAX_BULK_POTS']:
+        return bad_request('At most {} pots can be created at once'.format(
+            current_app.config['TEAFLASK_MAX_BULK_POTS']))
+
+    tea_ids = {tea_id for tea_id, in db.session.query(Tea.id)}
+    rows, results = [], []
+    for index, item in enumerate(items):
+        try:
+            row = Pot.row_from_json(item, tea_ids)
+        except ValidationError as e:
+            results.append({'index': index, 'status': 400, 'message': e.args[0]})
+            continue
+        row['brewer_id'] = brewer.id
+        rows.append(row)
+        results.append({'index': index, 'status': 201})
+    if rows:
+        Pot.bulk_insert(rows)
+
+    return json_response({
+        'results': results,
+        'created': len(rows),
+        'failed': len(items) - len(rows),
+    }), 201 if rows else 400
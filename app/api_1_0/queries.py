@@ -0,0 +1,12 @@
+from flask import current_app
+from ..models import Permission
+from . import api
+from .decorators import permission_required
+from .encoding import json_response
+
+
+@api.route('/queries/stats')
+@permission_required(Permission.ADMINISTER)
+def get_query_stats():
+    """The SQL statements run and the time they took, by endpoint, in this worker."""
+    return json_response(current_app.extensions['query_stats'].stats())
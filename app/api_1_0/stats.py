@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from flask import request
+from .. import db
+from ..conditional import conditional
+from ..exceptions import ValidationError
+from ..models import POT_ROLLUPS
+from . import api
+from .encoding import json_response
+from .filters import time_range
+
+# the range of the stats when no ?since= is given
+DEFAULT_RANGE = {
+    'hour': timedelta(days=2),
+    'day': timedelta(days=90),
+}
+BY = ('tea', 'brewer')
+
+
+@api.route('/stats/pots')
+def get_pot_stats():
+    """
+    The pots brewed and drank per hour or day, read from the rollups.
+
+    ?bucket=hour or day, ?since= and ?until= limit the range, ?tea_id= and
+    ?brewer_id= the pots, and ?by=tea or brewer splits the counts. ?total=1
+    adds the buckets up, so ?bucket=day&since=2015-10-01&by=brewer&total=1
+    gives the busiest brewers of a month, busiest first.
+    """
+    not_modified = conditional(('pots',))
+    if not_modified:
+        return not_modified
+
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in POT_ROLLUPS:
+        raise ValidationError('bucket must be one of ' + ', '.join(sorted(POT_ROLLUPS)))
+    by = request.args.get('by')
+    if by is not None and by not in BY:
+        raise ValidationError('by must be one of ' + ', '.join(BY))
+    total = request.args.get('total', '') in ('1', 'true')
+    rollup = POT_ROLLUPS[bucket]
+    since, until = time_range(request.args)
+    if since is None:
+        since = (until or datetime.utcnow()) - DEFAULT_RANGE[bucket]
+    since = rollup.truncate(since)
+
+    keys = [] if total else [rollup.bucket]
+    if by is not None:
+        keys.append(getattr(rollup, by + '_id'))
+    brewed = db.func.sum(rollup.brewed)
+    query = db.session.query(
+        *keys + [brewed, db.func.sum(rollup.drank), db.func.sum(rollup.drink_seconds)]
+    )
+    query = query.filter(rollup.bucket >= since)
+    if until is not None:
+        query = query.filter(rollup.bucket < until)
+    for name in ('tea_id', 'brewer_id'):
+        if request.args.get(name):
+            id_ = request.args.get(name, type=int)
+            if id_ is None:
+                raise ValidationError(name + ' must be an integer')
+            query = query.filter(getattr(rollup, name) == id_)
+    if keys:
+        query = query.group_by(*keys)
+    query = query.order_by(brewed.desc()) if total else query.order_by(*keys)
+
+    stats = []
+    for row in query:
+        values = dict(zip([key.key for key in keys], row))
+        brewed_count, drank_count, drink_seconds = row[len(keys):]
+        values.update({
+            'brewed': brewed_count or 0,
+            'drank': drank_count or 0,
+            'mean_drink_seconds': drink_seconds / drank_count if drank_count else None,
+        })
+        stats.append(values)
+    return json_response({
+        'bucket': bucket,
+        'since': since,
+        'until': until,
+        'stats': stats,
+    })
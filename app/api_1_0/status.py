@@ -0,0 +1,32 @@
+from queue import Empty
+from flask import Response, current_app
+from .. import hub
+from . import api
+
+
+@api.route('/status/stream')
+def status_stream():
+    """
+    Push brewed, brewed-many and drank events as Server-Sent Events.
+
+    The generator runs after the request has been torn down, so the stream
+    holds no database connection while it waits for events.
+    """
+    queue = hub.subscribe()
+    heartbeat = current_app.config['TEAFLASK_STREAM_HEARTBEAT']
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield queue.get(timeout=heartbeat)
+                except Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            hub.unsubscribe(queue)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -1,33 +1,70 @@
-from flask import jsonify, request, url_for
-from .. import db
+from flask import request
+from ..conditional import conditional
+from ..exceptions import ValidationError
 from ..models import Pot, Permission, Tea
 from . import api, api_paginate, api_create, api_get
 from .decorators import permission_required
+from .filters import pot_filters
+
+
+SORTS = {
+    'newest': (Tea.id,),
+    'popular': (Tea.pot_count, Tea.id),
+}
+RENDERS = ('html',)
+
+
+def render_mode():
+    """The ?render= of the request, html adds the rendered markdown to the teas."""
+    render = request.args.get('render')
+    if render is not None and render not in RENDERS:
+        raise ValidationError('render must be one of ' + ', '.join(RENDERS))
+    return render
 
 
 @api.route('/teas/')
 def get_teas():
+    """All teas, newest first or with ?sort=popular the most brewed first."""
+    sort = request.args.get('sort', 'newest')
+    if sort not in SORTS:
+        raise ValidationError('sort must be one of ' + ', '.join(sorted(SORTS)))
+    kwargs = {'sort': sort} if 'sort' in request.args else {}
+    render = render_mode()
+    if render is not None:
+        kwargs['render'] = render
     return api_paginate(
         'api.get_teas',
-        Tea.query.order_by(Tea.id.desc()),
-        tag_name='teas'
+        Tea.query,
+        tag_name='teas',
+        order_by=SORTS[sort],
+        descending=True,
+        json_kwargs={'render': render},
+        **kwargs
     )
 
 
 @api.route('/teas/<int:id_>')
 def get_tea(id_):
-    return api_get(Tea, id_)
+    """Get a tea, ?render=html adds the html of its markdown fields."""
+    return api_get(Tea, id_, render=render_mode())
 
 
 @api.route('/teas/<int:id_>/pots/')
 def get_tea_pots(id_):
-    """Get the pots brewed for a tea."""
+    """Get the pots brewed for a tea, filtered by ?since=, ?until= and ?drinkable=."""
+    not_modified = conditional(Pot.json_tables)
+    if not_modified:
+        return not_modified
     tea = Tea.query.get_or_404(id_)
+    criteria, kwargs = pot_filters(request.args)
     return api_paginate(
         'api.get_tea_pots',
-        tea.pots.order_by(Pot.brewed_at.desc()),
+        tea.pots.filter(*criteria),
         tag_name='pots',
-        id_=id_
+        order_by=(Pot.brewed_at, Pot.id),
+        descending=True,
+        id_=id_,
+        **kwargs
     )
 
 
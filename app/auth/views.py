@@ -3,7 +3,7 @@
 from flask import render_template, redirect, request, url_for, flash
 from flask.ext.login import login_user, logout_user, login_required, current_user
 from . import auth
-from .. import db
+from .. import db, last_seen
 from ..models import Brewer
 from ..email import send_email
 from .forms import LoginForm, RegistrationForm, ChangePasswordForm,\
@@ -14,7 +14,7 @@ from .forms import LoginForm, RegistrationForm, ChangePasswordForm,\
 def before_request():
     """Make sure users are confirmed."""
     if current_user.is_authenticated():
-        current_user.ping()
+        last_seen.touch(current_user.id)
         if not current_user.confirmed:
             flash('Your account is still unconfirmed.', 'warning')
 
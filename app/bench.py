@@ -0,0 +1,227 @@
+"""
+A load benchmark of the hot endpoints over a seeded dataset.
+
+The dataset is made from a random seed so that two runs over the same sizes
+get the same rows. The scenarios are run with the Flask test client, or over
+HTTP against a running server such as a local gunicorn, and each one reports
+its latency percentiles, throughput and, in process, the SQL statements per
+request, as JSON that can be compared between commits. A scenario which gets
+any other status than the one it expects, such as a redirect to the login
+page, stops the bench with a BenchError, as its timings would be those of
+that page.
+"""
+
+import json
+import math
+import re
+import subprocess
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+from . import db
+from .models import Tea
+from .seed import seed_database
+
+# the first of the seeded brewers, whose password is their username
+BENCH_USERNAME = 'brewer0'
+BENCH_EMAIL = 'brewer0@example.com'
+BENCH_PASSWORD = 'brewer0'
+# the seeded pots end here so that every run gets the same ones
+END = datetime(2016, 1, 1)
+
+
+class BenchError(Exception):
+
+    """The bench could not log in or a scenario got an unexpected status."""
+
+
+def seed_dataset(teas, brewers, pots, seed=0):
+    """Fill an empty database with the dataset of the given sizes."""
+    seed_database(teas, brewers, pots, years=1, seed=seed, end=END)
+
+
+def scenarios():
+    """
+    The (name, endpoint, method, path, body, status) of each scenario.
+
+    Paths are made from the dataset so the same rows are asked for every run.
+    The filtered scenarios are range scans of the brewed_at indexes: compare
+    'pots since' and 'tea pots since' with 'pots' and 'tea pots', and
+    'pots until' with 'pots deep page', the offset scan a client walking the
+    pages to the same old pots makes without the filter.
+    """
+    tea_id = db.session.query(Tea.id).order_by(Tea.pot_count.desc()).first()[0]
+    pots = [{'tea_id': tea_id}]
+    # the last month of the dataset, and a day a few months into it
+    month = (END - timedelta(days=30)).strftime('%Y-%m-%d')
+    old = (END - timedelta(days=270)).strftime('%Y-%m-%d')
+    return [
+        ('index', 'main.index', 'GET', '/', None, 200),
+        ('brew', 'main.brew', 'GET', '/brew/', None, 200),
+        ('pots', 'api.get_pots', 'GET', '/api/v1/pots/', None, 200),
+        ('pots deep page', 'api.get_pots', 'GET', '/api/v1/pots/?page=100', None, 200),
+        ('pots cursor', 'api.get_pots', 'GET', '/api/v1/pots/?cursor=&limit=50', None, 200),
+        ('tea pots', 'api.get_tea_pots', 'GET', '/api/v1/teas/{}/pots/'.format(tea_id), None, 200),
+        ('pots since', 'api.get_pots', 'GET', '/api/v1/pots/?since={}'.format(month), None, 200),
+        ('pots until', 'api.get_pots', 'GET', '/api/v1/pots/?until={}'.format(old), None, 200),
+        ('pots drinkable', 'api.get_pots', 'GET', '/api/v1/pots/?drinkable=true', None, 200),
+        ('tea pots since', 'api.get_tea_pots', 'GET',
+         '/api/v1/teas/{}/pots/?since={}'.format(tea_id, month), None, 200),
+        ('new pot', 'api.new_pot', 'POST', '/api/v1/pots/', pots[0], 201),
+        ('new pots', 'api.new_pot', 'POST', '/api/v1/pots/', pots * 50, 201),
+    ]
+
+
+def api_headers():
+    """The headers of the API requests, with the bench brewer's Basic auth."""
+    credentials = '{}:{}'.format(BENCH_USERNAME, BENCH_PASSWORD).encode('utf-8')
+    return {
+        'Authorization': 'Basic ' + b64encode(credentials).decode('utf-8'),
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+    }
+
+
+class TestClient:
+
+    """Run the requests in process with the app's test client."""
+
+    def __init__(self, app):
+        """Create a test client for the app."""
+        self.client = app.test_client()
+
+    def request(self, method, path, headers=None, body=None, form=None):
+        """Return the status and text of a response."""
+        response = self.client.open(
+            path, method=method, headers=headers,
+            data=form if form is not None else (json.dumps(body) if body is not None else None)
+        )
+        return response.status_code, response.get_data(as_text=True)
+
+
+class NoRedirect(HTTPRedirectHandler):
+
+    """Return redirects as they are, like the test client does."""
+
+    def redirect_request(self, *args, **kwargs):
+        """Don't follow the redirect, it raises an HTTPError instead."""
+        return None
+
+
+class HttpClient:
+
+    """Run the requests over HTTP against a running server."""
+
+    def __init__(self, url):
+        """Keep the cookies of the server's session."""
+        self.url = url.rstrip('/')
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect())
+
+    def request(self, method, path, headers=None, body=None, form=None):
+        """Return the status and text of a response."""
+        data = None
+        if form is not None:
+            data = urlencode(form).encode('utf-8')
+        elif body is not None:
+            data = json.dumps(body).encode('utf-8')
+        try:
+            with self.opener.open(Request(self.url + path, data, headers or {}, method=method)) as f:
+                return f.status, f.read().decode('utf-8')
+        except HTTPError as e:
+            return e.code, e.read().decode('utf-8')
+
+
+def log_in(client):
+    """
+    Log the client in as the bench brewer with the login form.
+
+    Raises BenchError unless the login redirects, a failed one shows the form again.
+    """
+    _, page = client.request('GET', '/login')
+    form = {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}
+    csrf_token = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page)
+    if csrf_token:
+        form['csrf_token'] = csrf_token.group(1)
+    status, _ = client.request('POST', '/login', form=form)
+    if status != 302:
+        raise BenchError('Could not log in as {}, the login got {}'.format(BENCH_EMAIL, status))
+
+
+def percentile(latencies, p):
+    """The nearest rank percentile of the sorted latencies."""
+    return latencies[max(0, int(math.ceil(p / 100 * len(latencies))) - 1)]
+
+
+def run_scenario(clients, method, path, body, status, requests):
+    """
+    Make the requests, each client in a thread of its own, and return their stats.
+
+    Raises BenchError with the first unexpected response if any request gets
+    another status than the expected one.
+    """
+    headers = api_headers() if path.startswith('/api/') else None
+    errors = []
+
+    def timed(client, count):
+        results = []
+        for _ in range(count):
+            start = time.time()
+            got, text = client.request(method, path, headers, body)
+            results.append((time.time() - start, got))
+            if got != status:
+                errors.append((got, text))
+        return results
+
+    counts = [requests // len(clients) + (i < requests % len(clients)) for i in range(len(clients))]
+    start = time.time()
+    with ThreadPoolExecutor(len(clients)) as executor:
+        results = sum(executor.map(timed, clients, counts), [])
+    elapsed = time.time() - start
+    if errors:
+        got, text = errors[0]
+        raise BenchError('{} {}: {} of {} requests got another status than {}, '
+                         'the first {}\n{}'.format(method, path, len(errors), requests,
+                                                   status, got, text))
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': requests,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': sum(latencies) / requests,
+        'throughput': requests / elapsed,
+    }
+
+
+def run_bench(app, url=None, requests=200, concurrency=1, warmup=10):
+    """Run every scenario and return the results."""
+    clients = [HttpClient(url) if url else TestClient(app) for _ in range(concurrency)]
+    for client in clients:
+        log_in(client)
+    query_stats = app.extensions['query_stats']
+    results = {}
+    for name, endpoint, method, path, body, status in scenarios():
+        if warmup:
+            run_scenario(clients, method, path, body, status, warmup)
+        query_stats.reset()
+        result = run_scenario(clients, method, path, body, status, requests)
+        stats = query_stats.stats().get(endpoint)
+        # over HTTP the statements are counted by the server's workers
+        result['queries_per_request'] = stats['mean_queries'] if stats and not url else None
+        results[name] = result
+    return results
+
+
+def commit():
+    """The commit being benchmarked, if this is a git checkout."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,110 @@
+"""Caching helpers shared by the app."""
+
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class VersionStamp:
+
+    """
+    A version number shared by every process on the host through a file.
+
+    The version is the modification time of the file, so checking it is one
+    stat() call and gunicorn workers can tell that another worker changed the
+    data they have cached without asking the database.
+    """
+
+    def __init__(self, path):
+        """Create the directory holding the stamp file."""
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def current(self):
+        """The current version, 0 if the stamp has never been bumped."""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        """Move to a new version which is always greater than the last."""
+        version = max(int(time.time() * 1e9), self.current() + 1)
+        with open(self.path, 'a'):
+            os.utime(self.path, ns=(version, version))
+        return version
+
+
+class TTLCache:
+
+    """
+    A bounded, least recently used cache whose entries expire.
+
+    When it has a VersionStamp, bumping the stamp from any worker empties the
+    cache in all of them the next time they read from it.
+    """
+
+    def __init__(self, maxsize, ttl, stamp=None):
+        """Create an empty cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stamp = stamp
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self._version = stamp.current() if stamp else 0
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            self._check_stamp()
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        """Store the value for ttl seconds, or the cache's ttl."""
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove the key from this worker's cache and return its value."""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def invalidate(self):
+        """Empty the cache, in every worker when there is a stamp."""
+        with self._lock:
+            self._data.clear()
+            if self.stamp:
+                self._version = self.stamp.bump()
+
+    def stats(self):
+        """The counters of the cache."""
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _check_stamp(self):
+        if self.stamp:
+            version = self.stamp.current()
+            if version != self._version:
+                self._data.clear()
+                self._version = version
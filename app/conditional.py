@@ -0,0 +1,100 @@
+"""
+Conditional GET support from per table version stamps.
+
+Every commit bumps the version stamps of the tables it wrote to. A response
+that is built from some tables gets an ETag made from their versions and the
+request URL, and a Last-Modified of the newest version, so an unchanged
+response is answered with a 304 by a few stat() calls, before any query,
+serialization or template rendering. Last-Modified only has whole seconds,
+so it is left out until the newest version is a second old, otherwise a
+write later in the same second would look unmodified.
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime
+from flask import g, request, Response
+from .cache import VersionStamp
+from .signals import tables_changed
+
+
+class TableVersions:
+
+    """The version stamps of the database tables."""
+
+    def __init__(self, app=None):
+        """Set up the stamps, optionally for the app straight away."""
+        self._stamps = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bump the stamps on commit and set the validators on responses."""
+        self.path = os.path.join(app.config['TEAFLASK_STATE_DIR'], 'tables')
+        tables_changed.connect(self._on_tables_changed, weak=False)
+        app.after_request(set_validators)
+        app.extensions['table_versions'] = self
+
+    def stamp(self, table):
+        """The VersionStamp of a table."""
+        if table not in self._stamps:
+            self._stamps[table] = VersionStamp(os.path.join(self.path, table))
+        return self._stamps[table]
+
+    def current(self, tables):
+        """The versions of the tables, in the given order."""
+        versions = []
+        for table in tables:
+            stamp = self.stamp(table)
+            # an unknown version may hide any change, so start a new one
+            versions.append(stamp.current() or stamp.bump())
+        return tuple(versions)
+
+    def bump(self, tables):
+        """Start new versions of the tables."""
+        for table in tables:
+            self.stamp(table).bump()
+
+    def _on_tables_changed(self, sender, tables):
+        self.bump(tables)
+
+
+def conditional(tables, *extra):
+    """
+    Answer a conditional GET for a response built from the tables.
+
+    extra are any other values the response depends on, such as the user.
+    Returns a 304 response when the client's copy is current, otherwise None
+    and the ETag and Last-Modified headers are added to the view's response.
+    """
+    from . import table_versions
+    versions = table_versions.current(tables)
+    etag = hashlib.md5(repr((request.full_path, extra, versions)).encode('utf-8')).hexdigest()
+    last_modified = None
+    if time.time() - max(versions) / 10 ** 9 >= 1:
+        last_modified = datetime.utcfromtimestamp(max(versions) // 10 ** 9)
+    g.validators = etag, last_modified
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (
+            last_modified is not None and
+            request.if_modified_since is not None and
+            last_modified <= request.if_modified_since.replace(tzinfo=None)
+        )
+    if not_modified:
+        return Response(status=304)
+    return None
+
+
+def set_validators(response):
+    """Add the validators of conditional to a successful response."""
+    validators = g.get('validators')
+    if validators is not None and response.status_code in (200, 304):
+        response.set_etag(validators[0])
+        if validators[1] is not None:
+            response.last_modified = validators[1]
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
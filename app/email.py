@@ -1,19 +1,18 @@
 """Helper methods to send emails."""
 
-from threading import Thread
+from queue import Full
 from flask import current_app, render_template, flash
 from flask.ext.mail import Message
-from . import mail
+from . import mail, outbox
 
 
-def send_async_email(app, msg):
-    """Target for thread."""
-    with app.app_context():
-        mail.send(msg)
+def send_email(to, subject, template, *, sync=False, **kwargs):
+    """
+    Send the email.
 
-
-def send_email(to, subject, template, *, async=False, **kwargs):
-    """Send the email."""
+    The email is put in the outbox to be delivered in the background unless
+    sync is set, in which case it is sent before returning.
+    """
     app = current_app._get_current_object()
     if app.config['MAIL_USERNAME'] is None or app.config['MAIL_PASSWORD'] is None:
         flash('Emails cannot be sent at this time. Please contact site admin.')
@@ -25,9 +24,11 @@ def send_email(to, subject, template, *, async=False, **kwargs):
     )
     msg.body = render_template(template + '.txt', **kwargs)
     msg.html = render_template(template + '.html', **kwargs)
-    if async:
-        thr = Thread(target=send_async_email, args=[app, msg])
-        thr.start()
-        return thr
-    else:
+    if sync:
         return mail.send(msg)
+    try:
+        outbox.put(msg)
+    except Full:
+        flash('Emails cannot be sent at this time. Please try again later.')
+        return None
+    return msg
@@ -0,0 +1,36 @@
+"""
+Cooperative psycopg2 for the eventlet gunicorn workers.
+
+psycopg2 is a C driver which blocks its thread while it waits on the server,
+so without help one slow query stops every greenlet of a worker. A wait
+callback makes psycopg2 hand the waiting over to eventlet's hub instead, as
+psycogreen does, so the other greenlets run while a query is in flight.
+gunicorn.py installs it in each worker after the fork.
+"""
+
+
+def eventlet_wait_callback(conn, timeout=-1):
+    """Wait for the connection to be ready by trampolining to the eventlet hub."""
+    from eventlet.hubs import trampoline
+    from psycopg2 import OperationalError, extensions
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise OperationalError('Bad result from poll: {!r}'.format(state))
+
+
+def patch_psycopg2():
+    """
+    Make every psycopg2 connection of the process wait cooperatively.
+
+    COPY is not supported by green connections, so the seed command must run
+    outside of the patched workers, which it does as a manage.py command.
+    """
+    from psycopg2 import extensions
+    extensions.set_wait_callback(eventlet_wait_callback)
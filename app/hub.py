@@ -0,0 +1,137 @@
+"""
+Fan pot events out to the Server-Sent Events subscribers.
+
+Every subscriber is a small bounded queue which its streaming response waits
+on, so an idle subscriber is a parked greenlet and nothing else. Each event is
+encoded once and the same frame is put on every queue. A bulk insert is one
+brewed-many event with the number of pots and their range of brewed_at, not
+an event per pot.
+
+On PostgreSQL events travel through NOTIFY and every gunicorn worker runs one
+LISTEN connection, however many subscribers it has, so subscribers see the
+pots brewed through any worker. Other backends fan out within the worker.
+"""
+
+import json
+import logging
+import select
+import time
+from queue import Queue, Full, Empty
+from threading import Lock, Thread
+from sqlalchemy import text
+from .signals import pot_brewed, pot_drank, pots_brewed
+
+logger = logging.getLogger(__name__)
+
+
+class Hub:
+
+    """Publish pot events to every subscribed queue."""
+
+    def __init__(self, app=None):
+        """Set up the hub, optionally for the app straight away."""
+        self._lock = Lock()
+        self._subscribers = set()
+        self._listener = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the settings and listen for pot signals."""
+        self.app = app
+        self.queue_size = app.config['TEAFLASK_STREAM_QUEUE_SIZE']
+        self.channel = app.config['TEAFLASK_STREAM_CHANNEL']
+        self.use_notify = app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql')
+        pot_brewed.connect(self._on_brewed, weak=False)
+        pot_drank.connect(self._on_drank, weak=False)
+        pots_brewed.connect(self._on_brewed_many, weak=False)
+        app.extensions['hub'] = self
+
+    def subscribe(self):
+        """Return a new queue which receives every event frame."""
+        queue = Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.add(queue)
+            if self.use_notify and self._listener is None:
+                self._listener = Thread(target=self._listen, name='teaflask-hub', daemon=True)
+                self._listener.start()
+        return queue
+
+    def unsubscribe(self, queue):
+        """Stop sending events to the queue."""
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def publish(self, frame):
+        """Put the frame on every queue, dropping the oldest for slow readers."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            while True:
+                try:
+                    queue.put_nowait(frame)
+                    break
+                except Full:
+                    try:
+                        queue.get_nowait()
+                    except Empty:
+                        pass
+
+    @property
+    def subscriber_count(self):
+        """The number of subscribed queues in this worker."""
+        return len(self._subscribers)
+
+    def _on_brewed(self, sender, pot):
+        self._send('brewed', pot)
+
+    def _on_drank(self, sender, pot):
+        self._send('drank', pot)
+
+    def _on_brewed_many(self, sender, pots):
+        self._send('brewed-many', {
+            'count': len(pots),
+            'brewer_ids': sorted({pot['brewer_id'] for pot in pots if pot['brewer_id'] is not None}),
+            'first_brewed_at': min(pot['brewed_at'] for pot in pots),
+            'last_brewed_at': max(pot['brewed_at'] for pot in pots),
+        })
+
+    def _send(self, event, data):
+        from .models import DATE_FORMAT
+        data = {
+            key: value.strftime(DATE_FORMAT) if hasattr(value, 'strftime') else value
+            for key, value in data.items()
+        }
+        frame = 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data))
+        if not self.use_notify:
+            self.publish(frame)
+            return
+        from . import db
+        with self.app.app_context():
+            db.get_engine(self.app).execute(
+                text('SELECT pg_notify(:channel, :payload)').execution_options(autocommit=True),
+                channel=self.channel,
+                payload=frame
+            )
+
+    def _listen(self):
+        """Publish the frames notified on the channel, reconnecting on errors."""
+        from . import db
+        while True:
+            try:
+                with self.app.app_context():
+                    connection = db.get_engine(self.app).raw_connection()
+                # the connection is kept for good, it does not count against the pool
+                connection.detach()
+                dbapi_connection = connection.connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute('LISTEN "{}"'.format(self.channel))
+                while True:
+                    if select.select([dbapi_connection], [], [], 60) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self.publish(dbapi_connection.notifies.pop(0).payload)
+            except Exception:
+                logger.exception('Lost the %s LISTEN connection', self.channel)
+                time.sleep(1)
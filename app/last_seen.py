@@ -0,0 +1,84 @@
+"""
+Coalesced updates of Brewer.last_seen.
+
+Writing last_seen on every request turns browsing into a stream of UPDATEs
+and commits. The tracker only records a brewer once per interval and a
+background thread writes everything recorded since its last run as one
+executemany UPDATE. The batches bump LAST_SEEN_TABLE rather than brewers, so
+only the responses which show last_seen change their validators.
+"""
+
+import atexit
+import logging
+import time
+from datetime import datetime
+from threading import Lock, Thread
+from sqlalchemy import bindparam
+from .signals import tables_changed
+
+logger = logging.getLogger(__name__)
+
+# the version stamp of the last_seen column, see conditional.TableVersions
+LAST_SEEN_TABLE = 'brewers.last_seen'
+
+
+class LastSeenTracker:
+
+    """Batch the last_seen timestamps of brewers."""
+
+    def __init__(self, app=None):
+        """Set up the tracker, optionally for the app straight away."""
+        self._lock = Lock()
+        self._seen = {}
+        self._pending = {}
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the settings and flush what is left when the process exits."""
+        self.app = app
+        self.interval = app.config['TEAFLASK_LAST_SEEN_INTERVAL']
+        self.flush_interval = app.config['TEAFLASK_LAST_SEEN_FLUSH_INTERVAL']
+        app.extensions['last_seen'] = self
+        atexit.register(self.flush)
+
+    def touch(self, brewer_id):
+        """Note that the brewer was seen, at most once per interval."""
+        now = datetime.utcnow()
+        with self._lock:
+            last = self._seen.get(brewer_id)
+            if last is not None and (now - last).total_seconds() < self.interval:
+                return
+            self._seen[brewer_id] = now
+            self._pending[brewer_id] = now
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='teaflask-last-seen', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Write the pending timestamps in one statement, return how many."""
+        from . import db
+        from .models import Brewer
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        table = Brewer.__table__
+        with self.app.app_context():
+            db.engine.execute(
+                table.update().where(table.c.id == bindparam('brewer_id')).values(
+                    last_seen=bindparam('seen_at')
+                ),
+                [{'brewer_id': k, 'seen_at': v} for k, v in pending.items()]
+            )
+        tables_changed.send(self.app, tables={LAST_SEEN_TABLE})
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write last_seen')
@@ -0,0 +1,102 @@
+"""
+The cached ranking of brewers by the pots they brewed.
+
+Each window's ranking is loaded from the daily pot rollups and kept for
+TEAFLASK_LEADERBOARD_TTL seconds, while the pots committed through this
+worker move their brewers up it.
+"""
+
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+from .signals import pot_brewed, pots_brewed
+
+# the days of each window, counting today, None for every pot
+WINDOWS = {
+    '7d': 7,
+    '30d': 30,
+    'all': None,
+}
+
+_Board = namedtuple('_Board', ['expires', 'since', 'ranking', 'positions'])
+
+
+class Leaderboard:
+
+    """Rank the brewers by pots brewed in each window."""
+
+    def __init__(self, app=None):
+        """Set up the boards, optionally for the app straight away."""
+        self._lock = Lock()
+        self._boards = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the settings and listen for new pots."""
+        self.ttl = app.config['TEAFLASK_LEADERBOARD_TTL']
+        self.size = app.config['TEAFLASK_LEADERBOARD_SIZE']
+        self.invalidate()
+        pot_brewed.connect(self._on_pot_brewed, weak=False)
+        pots_brewed.connect(self._on_pots_brewed, weak=False)
+        app.extensions['leaderboard'] = self
+
+    def get(self, window):
+        """The start of the window (None for all) and its top brewers as [pots, id, username]."""
+        board = self._boards.get(window)
+        if board is None or board.expires < time.time():
+            board = self._load(window)
+            with self._lock:
+                self._boards[window] = board
+        with self._lock:
+            return board.since, [list(entry) for entry in board.ranking[:self.size]]
+
+    def invalidate(self):
+        """Forget the boards of this worker."""
+        with self._lock:
+            self._boards.clear()
+
+    def _on_pot_brewed(self, sender, pot):
+        self._count([pot])
+
+    def _on_pots_brewed(self, sender, pots):
+        self._count(pots)
+
+    def _count(self, pots):
+        """Move the brewers of the new pots up the boards."""
+        with self._lock:
+            for pot in pots:
+                for window, board in list(self._boards.items()):
+                    if board.since is not None and pot['brewed_at'] < board.since:
+                        continue
+                    position = board.positions.get(pot['brewer_id'])
+                    if position is None:
+                        # a brewer new to the board, whose name is not loaded
+                        del self._boards[window]
+                        continue
+                    ranking, positions = board.ranking, board.positions
+                    ranking[position][0] += 1
+                    while position > 0 and ranking[position - 1][0] < ranking[position][0]:
+                        ranking[position - 1], ranking[position] = ranking[position], ranking[position - 1]
+                        positions[ranking[position][1]] = position
+                        position -= 1
+                    positions[ranking[position][1]] = position
+
+    def _load(self, window):
+        """Count every brewer's pots in the window with one query on the rollups."""
+        from . import db
+        from .models import Brewer, DailyPotRollup
+        since = None
+        if WINDOWS[window] is not None:
+            today = DailyPotRollup.truncate(datetime.utcnow())
+            since = today - timedelta(days=WINDOWS[window] - 1)
+        pots = db.func.sum(DailyPotRollup.brewed)
+        query = db.session.query(pots, Brewer.id, Brewer.username).select_from(Brewer).join(
+            DailyPotRollup, DailyPotRollup.brewer_id == Brewer.id
+        ).group_by(Brewer.id, Brewer.username).order_by(pots.desc(), Brewer.id)
+        if since is not None:
+            query = query.filter(DailyPotRollup.bucket >= since)
+        ranking = [[count, id_, username] for count, id_, username in query if count]
+        positions = {entry[1]: position for position, entry in enumerate(ranking)}
+        return _Board(time.time() + self.ttl, since, ranking, positions)
@@ -1,21 +1,24 @@
 """Main tea related views."""
 
 from . import main
-from .. import db
+from .. import db, status_cache
 from .forms import PotForm, TeaForm, EditProfileForm, EditProfileAdminForm
 from ..models import Pot, Brewer, Tea, Role
+from ..conditional import conditional
 from ..decorators import admin_required, add_or_edit_view
-from flask import render_template, flash, redirect, url_for
+from flask import render_template, flash, redirect, session, url_for
 from flask.ext.login import current_user, login_required
 from datetime import datetime
-from sqlalchemy import func
 
 
 @main.route('/')
 def index():
     """The main tea screen."""
-    pot = Pot.query.filter_by(drank_at=None).order_by(Pot.brewed_at.desc()).first()
-    pots = Pot.query.order_by(Pot.brewed_at.desc()).limit(10)
+    if '_flashes' not in session:
+        not_modified = conditional(Pot.json_tables, current_user.get_id())
+        if not_modified:
+            return not_modified
+    pot, pots = status_cache.get()
     return render_template('main/index.html', pot=pot, pots=pots)
 
 
@@ -36,7 +39,7 @@ def brew():
             db.session.add(pot)
             flash('A pot of {} has been brewed.'.format(tea.name), 'info')
             return redirect(url_for('main.index'))
-    teas = Tea.query.outerjoin(Pot).order_by(func.count(Tea.pots).desc()).group_by(Tea.id).all()
+    teas = Tea.query.order_by(Tea.pot_count.desc(), Tea.name).all()
     return render_template('main/brewed.html', form=form, teas=teas)
 
 
@@ -0,0 +1,275 @@
+"""
+Request, database pool and cache metrics in the Prometheus text format.
+
+Every worker counts its own requests, by endpoint, method and status, with a
+latency histogram per endpoint, the requests in flight, the connections it
+checked out of the pool and the hits and misses of its caches. Each worker
+writes its numbers to a file named after its pid and a token of its own in
+the state directory at most once every TEAFLASK_METRICS_WRITE_INTERVAL
+seconds and when it exits, and /metrics adds up the files of all the
+workers. The files of workers which have exited are reaped: their counters
+are added to retired.json, so that the totals never go backwards, and their
+gauges are dropped.
+"""
+
+import atexit
+import fcntl
+import glob
+import json
+import os
+import time
+import uuid
+from bisect import bisect_left
+from threading import Lock
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from .cache import TTLCache
+
+
+class Metrics:
+
+    """Count the requests of this worker and report those of all of them."""
+
+    def __init__(self, app=None):
+        """Set up the counters, optionally for the app straight away."""
+        self._lock = Lock()
+        self._requests = {}
+        self._latency = {}
+        self._in_flight = 0
+        self._checkouts = 0
+        self._checked_out = 0
+        self._written = 0
+        self._listening = False
+        self._pid = self._token = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Time the app's requests, watch the pool and serve /metrics."""
+        self.app = app
+        self.buckets = tuple(app.config['TEAFLASK_METRICS_BUCKETS'])
+        self.interval = app.config['TEAFLASK_METRICS_WRITE_INTERVAL']
+        self.path = os.path.join(app.config['TEAFLASK_STATE_DIR'], 'metrics')
+        os.makedirs(self.path, exist_ok=True)
+        if not self._listening:
+            event.listen(Pool, 'checkout', self._on_checkout)
+            event.listen(Pool, 'checkin', self._on_checkin)
+            atexit.register(self._write_at_exit)
+            self._listening = True
+        app.before_request(self._start_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._end_request)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        app.extensions['metrics'] = self
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self._checkouts += 1
+            self._checked_out += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._checked_out -= 1
+
+    def _start_request(self):
+        g.metrics_start = time.time()
+        with self._lock:
+            self._in_flight += 1
+
+    def _after_request(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _end_request(self, exc):
+        start = g.get('metrics_start')
+        if start is None:
+            return
+        duration = time.time() - start
+        endpoint = request.endpoint or 'none'
+        key = (endpoint, request.method, str(g.get('metrics_status', 500)))
+        with self._lock:
+            self._in_flight -= 1
+            self._requests[key] = self._requests.get(key, 0) + 1
+            latency = self._latency.setdefault(endpoint, [[0] * (len(self.buckets) + 1), 0.0])
+            latency[0][bisect_left(self.buckets, duration)] += 1
+            latency[1] += duration
+        if time.time() - self._written >= self.interval:
+            self.write()
+
+    def snapshot(self):
+        """The numbers of this worker, as saved in its file."""
+        with self._lock:
+            data = {
+                'pid': os.getpid(),
+                'requests': [list(key) + [count] for key, count in self._requests.items()],
+                'latency': [
+                    [endpoint, list(counts), total]
+                    for endpoint, (counts, total) in self._latency.items()
+                ],
+                'in_flight': self._in_flight,
+                'checkouts': self._checkouts,
+                'checked_out': self._checked_out,
+            }
+        data['caches'] = {
+            name: extension.stats()
+            for name, extension in self.app.extensions.items()
+            if isinstance(extension, TTLCache)
+        }
+        return data
+
+    def write(self):
+        """Save this worker's numbers for the others to read."""
+        if self._pid != os.getpid():
+            # a pid can be reused, the token keeps a new worker off an old file
+            self._pid, self._token = os.getpid(), uuid.uuid4().hex
+        self._written = time.time()
+        path = os.path.join(self.path, '{}-{}.json'.format(self._pid, self._token))
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def _write_at_exit(self):
+        # the requests since the last write, if this process served any
+        if self._requests:
+            self.write()
+
+    def collect(self):
+        """The numbers of every worker, this one's current ones included."""
+        self.write()
+        with open(os.path.join(self.path, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            workers, dead = [], []
+            for path in glob.glob(os.path.join(self.path, '*-*.json')):
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    # a worker is replacing its file
+                    continue
+                alive = _alive(data['pid']) and not (
+                    data['pid'] == self._pid and not path.endswith(self._token + '.json'))
+                (workers if alive else dead).append((path, data))
+            retired = self._reap([data for _, data in dead])
+            for path, _ in dead:
+                os.remove(path)
+        return [retired] + [data for _, data in workers]
+
+    def _reap(self, dead):
+        """Add the counters of the dead workers to retired.json and return it."""
+        path = os.path.join(self.path, 'retired.json')
+        try:
+            with open(path) as f:
+                retired = json.load(f)
+        except FileNotFoundError:
+            retired = add_up([])
+        if dead:
+            retired = add_up([retired] + dead)
+            retired['in_flight'] = retired['checked_out'] = 0
+            with open(path + '.tmp', 'w') as f:
+                json.dump(retired, f)
+            os.replace(path + '.tmp', path)
+        return retired
+
+    def render(self):
+        """The metrics of all the workers in the Prometheus text format."""
+        totals = add_up(self.collect())
+        requests = {(e, m, s): count for e, m, s, count in totals['requests']}
+        latency = {endpoint: (counts, total) for endpoint, counts, total in totals['latency']}
+        caches = {name: (stats['hits'], stats['misses']) for name, stats in totals['caches'].items()}
+        in_flight, checkouts, checked_out = (
+            totals['in_flight'], totals['checkouts'], totals['checked_out'])
+
+        durations = []
+        for endpoint, (counts, total) in sorted(latency.items()):
+            cumulative = 0
+            for le, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                durations.append(('_bucket', {'endpoint': endpoint, 'le': str(le)}, cumulative))
+            durations.append(('_sum', {'endpoint': endpoint}, total))
+            durations.append(('_count', {'endpoint': endpoint}, cumulative))
+        caches = sorted(caches.items())
+
+        lines = []
+        for name, type_, help_, samples in [
+            ('teaflask_http_requests_total', 'counter', 'Requests by endpoint, method and status.', [
+                ('', {'endpoint': e, 'method': m, 'status': s}, count)
+                for (e, m, s), count in sorted(requests.items())
+            ]),
+            ('teaflask_http_request_duration_seconds', 'histogram', 'Request latency by endpoint.',
+             durations),
+            ('teaflask_http_requests_in_flight', 'gauge', 'Requests being handled.', [
+                ('', {}, in_flight)
+            ]),
+            ('teaflask_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool.', [
+                ('', {}, checkouts)
+            ]),
+            ('teaflask_db_pool_checked_out', 'gauge', 'Connections checked out now.', [
+                ('', {}, checked_out)
+            ]),
+            ('teaflask_cache_hits_total', 'counter', 'Cache hits.', [
+                ('', {'cache': cache}, hits) for cache, (hits, misses) in caches
+            ]),
+            ('teaflask_cache_misses_total', 'counter', 'Cache misses.', [
+                ('', {'cache': cache}, misses) for cache, (hits, misses) in caches
+            ]),
+            ('teaflask_cache_hit_ratio', 'gauge', 'Hits over reads of each cache.', [
+                ('', {'cache': cache}, hits / (hits + misses))
+                for cache, (hits, misses) in caches if hits + misses
+            ]),
+        ]:
+            lines.append('# HELP {} {}'.format(name, help_))
+            lines.append('# TYPE {} {}'.format(name, type_))
+            for suffix, labels, value in samples:
+                lines.append(sample(name + suffix, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        """Serve the metrics to Prometheus."""
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def add_up(workers):
+    """Add up the numbers of the workers, in the format of their files."""
+    requests, latency, caches = {}, {}, {}
+    totals = {'in_flight': 0, 'checkouts': 0, 'checked_out': 0}
+    for data in workers:
+        for endpoint, method, status, count in data['requests']:
+            key = (endpoint, method, status)
+            requests[key] = requests.get(key, 0) + count
+        for endpoint, counts, total in data['latency']:
+            if endpoint not in latency:
+                latency[endpoint] = [[0] * len(counts), 0.0]
+            latency[endpoint][0] = [a + b for a, b in zip(latency[endpoint][0], counts)]
+            latency[endpoint][1] += total
+        for name, stats in data['caches'].items():
+            hits, misses = caches.get(name, (0, 0))
+            caches[name] = (hits + stats['hits'], misses + stats['misses'])
+        for key in totals:
+            totals[key] += data[key]
+    totals.update(
+        requests=[list(key) + [count] for key, count in sorted(requests.items())],
+        latency=[[endpoint, counts, total] for endpoint, (counts, total) in sorted(latency.items())],
+        caches={name: {'hits': hits, 'misses': misses} for name, (hits, misses) in caches.items()},
+    )
+    return totals
+
+
+def sample(name, labels, value):
+    """One line of a metric."""
+    if not labels:
+        return '{} {}'.format(name, value)
+    return '{}{{{}}} {}'.format(name, ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+        for k, v in sorted(labels.items())
+    ), value)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -2,12 +2,20 @@
 
 from . import db, login_manager
 from .exceptions import ValidationError
-from flask import current_app, request, url_for
+from .last_seen import LAST_SEEN_TABLE
+from .serialize import JsonField, column, default_fields, related, serialize
+from .signals import pots_brewed, send_on_commit, tables_changed
+from .urls import build_url
+from flask import current_app, request
 from flask.ext.login import AnonymousUserMixin, UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.datastructures import MultiDict
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import get_history
 from datetime import datetime
+from markdown import markdown
 import hashlib
 
 
@@ -19,6 +27,15 @@ class Pot(db.Model):
     """The class which represents a pot of tea that has been made."""
 
     __tablename__ = 'pots'
+    __table_args__ = (
+        db.Index(
+            'ix_pots_undrunk_brewed_at', 'drank_at', 'brewed_at',
+            postgresql_where=db.text('drank_at IS NULL')
+        ),
+        db.Index('ix_pots_brewed_at_id', 'brewed_at', 'id'),
+        db.Index('ix_pots_tea_id_brewed_at_id', 'tea_id', 'brewed_at', 'id'),
+        db.Index('ix_pots_brewer_id_brewed_at_id', 'brewer_id', 'brewed_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     brewed_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -26,6 +43,21 @@ class Pot(db.Model):
     tea_id = db.Column(db.Integer, db.ForeignKey('teas.id'))
     brewer_id = db.Column(db.Integer, db.ForeignKey('brewers.id'))
 
+    json_fields = {
+        'id': column('id'),
+        'url': JsonField(lambda pot, expand: Pot.get_url(pot.id), ('id',)),
+        'brewed_at': column('brewed_at'),
+        'drank_at': column('drank_at'),
+        'tea': related('tea', 'tea_id', lambda id_: Tea.get_url(id_)),
+        'tea_name': JsonField(lambda pot, expand: pot.tea.name, ('tea_id',), 'tea', ('name',)),
+        'brewer': related('brewer', 'brewer_id', lambda id_: Brewer.get_url(id_)),
+        'brewer_username': JsonField(
+            lambda pot, expand: pot.brewer.username, ('brewer_id',), 'brewer', ('username',)
+        ),
+    }
+    # tables whose changes change the json, for conditional GETs
+    json_tables = ('pots', 'teas', 'brewers')
+
     @property
     def drinkable(self):
         """If pot has not been drank."""
@@ -35,19 +67,9 @@ class Pot(db.Model):
         """String representation."""
         return '<Pot {} -{}>'.format(self.id, self.tea.name)
 
-    def to_json(self):
+    def to_json(self, fields=None, expand=()):
         """Output the pot to a API format."""
-        drank_at = self.drank_at.strftime(DATE_FORMAT) if self.drank_at else None
-        return {
-            'id': self.id,
-            'url': Pot.get_url(self.id),
-            'brewed_at': self.brewed_at.strftime(DATE_FORMAT),
-            'drank_at': drank_at,
-            'tea': Tea.get_url(self.tea_id),
-            'tea_name': self.tea.name,
-            'brewer': Brewer.get_url(self.brewer_id),
-            'brewer_username': self.brewer.username,
-        }
+        return serialize(self, fields, expand)
 
     @staticmethod
     def from_json(data):
@@ -55,10 +77,56 @@ class Pot(db.Model):
         from app.main.forms import PotForm
         return from_json_helper(data, Pot, PotForm)
 
+    @staticmethod
+    def row_from_json(data, tea_ids):
+        """
+        Return the column values of a pot from a json blob, for bulk inserts.
+
+        tea_ids is the set of valid tea ids, looked up once for the whole
+        batch. brewed_at and drank_at are optional so that events recorded
+        while offline keep their times.
+        """
+        if not isinstance(data, dict):
+            raise ValidationError('Each pot must be an object')
+        # not just equal to an id, True == 1 and lists cannot be looked up
+        if type(data.get('tea_id')) is not int or data['tea_id'] not in tea_ids:
+            raise ValidationError('Not a valid tea_id')
+        try:
+            brewed_at = datetime.strptime(data['brewed_at'], DATE_FORMAT) \
+                if data.get('brewed_at') else datetime.utcnow()
+            drank_at = datetime.strptime(data['drank_at'], DATE_FORMAT) \
+                if data.get('drank_at') else None
+        except (TypeError, ValueError):
+            raise ValidationError('Dates must be formatted as ' + DATE_FORMAT)
+        if drank_at is not None and drank_at < brewed_at:
+            raise ValidationError('A pot cannot be drank before it is brewed')
+        return {
+            'tea_id': data['tea_id'],
+            'brewer_id': None,
+            'brewed_at': brewed_at,
+            'drank_at': drank_at,
+        }
+
+    @staticmethod
+    def bulk_insert(rows):
+        """
+        Insert the rows of row_from_json with one executemany and commit.
+
+        The ORM events are bypassed so the tea counters, the rollups and the
+        signals are taken care of here, with one pots_brewed for all the pots.
+        """
+        connection = db.session.connection()
+        connection.execute(Pot.__table__.insert(), rows)
+        count_new_pots(connection, rows)
+        rollup_pots(connection, [pot_event for row in rows for pot_event in pot_events(row)])
+        send_on_commit(db.session, pots_brewed, pots=[dict(row) for row in rows])
+        send_on_commit(db.session, tables_changed, tables={'pots', 'teas'})
+        db.session.commit()
+
     @staticmethod
     def get_url(id_):
         """Return the URL for the object with the given id."""
-        return url_for('api.get_pot', id_=id_, _external=True)
+        return build_url('api.get_pot', id_)
 
 
 class Tea(db.Model):
@@ -75,26 +143,65 @@ class Tea(db.Model):
     description = db.Column(db.Text())
     brewing_methods = db.Column(db.Text())
     tasting_notes = db.Column(db.Text())
+    # rendered from the markdown fields whenever they are set
+    description_html = db.Column(db.Text())
+    brewing_methods_html = db.Column(db.Text())
+    tasting_notes_html = db.Column(db.Text())
+    # maintained as pots are inserted, see count_new_pots
+    pot_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_brewed_at = db.Column(db.DateTime)
     pots = db.relationship('Pot', backref='tea', lazy='dynamic')
 
+    json_fields = {
+        'id': column('id'),
+        'url': JsonField(lambda tea, expand: Tea.get_url(tea.id), ('id',)),
+        'name': column('name'),
+        'category': column('category'),
+        'location': column('location'),
+        'image_url': column('image_url'),
+        'description': column('description'),
+        'brewing_methods': column('brewing_methods'),
+        'tasting_notes': column('tasting_notes'),
+        'description_html': column('description_html', default=False),
+        'brewing_methods_html': column('brewing_methods_html', default=False),
+        'tasting_notes_html': column('tasting_notes_html', default=False),
+        'pot_count': column('pot_count'),
+        'last_brewed_at': column('last_brewed_at'),
+        'pots': JsonField(lambda tea, expand: build_url('api.get_tea_pots', tea.id), ('id',)),
+    }
+    json_tables = ('teas', 'pots')
+    markdown_fields = ('description', 'brewing_methods', 'tasting_notes')
+
     def __repr__(self):
         """String representation."""
         return '<Tea {}>'.format(self.name)
 
-    def to_json(self):
-        """Output the tea to a API format."""
-        return {
-            'id': self.id,
-            'url': Tea.get_url(self.id),
-            'name': self.name,
-            'category': self.category,
-            'location': self.location,
-            'image_url': self.image_url,
-            'description': self.description,
-            'brewing_methods': self.brewing_methods,
-            'tasting_notes': self.tasting_notes,
-            'pots': url_for('api.get_tea_pots', id_=self.id, _external=True),
-        }
+    def to_json(self, fields=None, expand=(), render=None):
+        """Output the tea to a API format, render='html' adds the rendered html."""
+        if fields is None and render == 'html':
+            fields = default_fields(Tea) + [field + '_html' for field in Tea.markdown_fields]
+        return serialize(self, fields, expand)
+
+    @staticmethod
+    def render_all_markdown():
+        """Render the markdown fields of every tea into their _html columns."""
+        for tea in Tea.query:
+            for field in Tea.markdown_fields:
+                render_markdown(tea, getattr(tea, field), field)
+        db.session.commit()
+
+    @staticmethod
+    def rebuild_counters():
+        """Recount pot_count and last_brewed_at for every tea from the pots."""
+        teas, pots = Tea.__table__, Pot.__table__
+        db.session.execute(teas.update().values(
+            pot_count=db.select([db.func.count(pots.c.id)]).where(
+                pots.c.tea_id == teas.c.id).as_scalar(),
+            last_brewed_at=db.select([db.func.max(pots.c.brewed_at)]).where(
+                pots.c.tea_id == teas.c.id).as_scalar(),
+        ))
+        send_on_commit(db.session, tables_changed, tables={'teas'})
+        db.session.commit()
 
     @staticmethod
     def from_json(data):
@@ -105,7 +212,14 @@ class Tea(db.Model):
     @staticmethod
     def get_url(id_):
         """Return the URL for the object with the given id."""
-        return url_for('api.get_tea', id_=id_, _external=True)
+        return build_url('api.get_tea', id_)
+
+
+def role_json(brewer, expand):
+    """A brewer's role by name, or the whole role when expanded."""
+    if brewer.role is None:
+        return None
+    return brewer.role.to_json() if 'role' in expand else brewer.role.name
 
 
 class Brewer(UserMixin, db.Model):
@@ -128,11 +242,27 @@ class Brewer(UserMixin, db.Model):
     avatar_hash = db.Column(db.String(32))
     pots = db.relationship('Pot', backref='brewer', lazy='dynamic')
 
+    json_fields = {
+        'id': column('id'),
+        'url': JsonField(lambda brewer, expand: Brewer.get_url(brewer.id), ('id',)),
+        'email': column('email'),
+        'username': column('username'),
+        'role': JsonField(role_json, ('role_id',), 'role', ('name',), expand=True),
+        'confirmed': column('confirmed'),
+        'name': column('name'),
+        'location': column('location'),
+        'about_me': column('about_me'),
+        'member_since': column('member_since'),
+        'last_seen': column('last_seen'),
+        'pots': JsonField(lambda brewer, expand: build_url('api.get_brewer_pots', brewer.id), ('id',)),
+    }
+    json_tables = ('brewers', LAST_SEEN_TABLE, 'roles')
+
     def __init__(self, **kwargs):
         """Set the role and avatar_hash."""
         super(Brewer, self).__init__(**kwargs)
         if self.role is None:
-            self.role = Role.query.filter_by(default=True).first()
+            self.role = Role.default_role()
         if self.email is not None and self.avatar_hash is None:
             self.avatar_hash = hashlib.md5(self.email.encode('utf-8')).hexdigest()
 
@@ -222,11 +352,6 @@ class Brewer(UserMixin, db.Model):
         """Helper to check is user is Administrator."""
         return self.can(Permission.ADMINISTER)
 
-    def ping(self):
-        """Update the last_seen."""
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
-
     def gravatar(self, size=100, default='identicon', rating='g'):
         """Get gravatar for the users email."""
         if request.is_secure:
@@ -248,36 +373,31 @@ class Brewer(UserMixin, db.Model):
         return s.dumps({'id': self.id}).decode('ascii')
 
     @staticmethod
-    def verify_auth_token(token):
-        """Get the user from token."""
+    def read_auth_token(token):
+        """Get the (user id, expiry timestamp) of a valid token or None."""
         s = Serializer(current_app.config['SECRET_KEY'])
         try:
-            data = s.loads(token)
+            data, header = s.loads(token, return_header=True)
+            return data['id'], header['exp']
         except:
             return None
-        return Brewer.query.get(data['id'])
 
-    def to_json(self):
+    @staticmethod
+    def verify_auth_token(token):
+        """Get the user from token."""
+        token_data = Brewer.read_auth_token(token)
+        if token_data is None:
+            return None
+        return Brewer.query.get(token_data[0])
+
+    def to_json(self, fields=None, expand=()):
         """Serialize to json."""
-        return {
-            'id': self.id,
-            'url': Brewer.get_url(self.id),
-            'email': self.email,
-            'username': self.username,
-            'role': self.role.name if self.role else None,
-            'confirmed': self.confirmed,
-            'name': self.name,
-            'location': self.location,
-            'about_me': self.about_me,
-            'member_since': self.member_since.strftime(DATE_FORMAT),
-            'last_seen': self.last_seen.strftime(DATE_FORMAT),
-            'pots': url_for('api.get_brewer_pots', id_=self.id, _external=True),
-        }
+        return serialize(self, fields, expand)
 
     @staticmethod
     def get_url(id_):
         """Return the URL for the object with the given id."""
-        return url_for('api.get_brewer', id_=id_, _external=True)
+        return build_url('api.get_brewer', id_)
 
     def __repr__(self):
         """String representation."""
@@ -327,6 +447,32 @@ class Role(db.Model):
     permissions = db.Column(db.Integer)
     brewers = db.relationship('Brewer', backref='role', lazy='dynamic')
 
+    json_fields = {
+        'id': column('id'),
+        'url': JsonField(lambda role, expand: build_url('api.get_role', role.id), ('id',)),
+        'name': column('name'),
+        'default': column('default'),
+        'permissions': column('permissions'),
+        'brewers': JsonField(lambda role, expand: build_url('api.get_role_brewers', role.id), ('id',)),
+    }
+    json_tables = ('roles',)
+    # the id of the default role, looked up once per process
+    _default_id = None
+
+    @staticmethod
+    def default_role():
+        """
+        The role of new brewers.
+
+        Once its id is known the role comes from the session's identity map,
+        so creating many brewers in a session does not query it every time.
+        """
+        role = Role.query.get(Role._default_id) if Role._default_id is not None else None
+        if role is None or not role.default:
+            role = Role.query.filter_by(default=True).first()
+            Role._default_id = role.id if role is not None else None
+        return role
+
     @staticmethod
     def insert_roles():
         """Insert all of the roles into the database."""
@@ -345,25 +491,297 @@ class Role(db.Model):
             db.session.add(role)
         db.session.commit()
 
-    def to_json(self):
+    def to_json(self, fields=None, expand=()):
         """The json repr of a Role."""
-        return {
-            'id': self.id,
-            'url': url_for('api.get_role', id_=self.id, _external=True),
-            'name': self.name,
-            'default': self.default,
-            'permissions': self.permissions,
-            'brewers': url_for('api.get_role_brewers', id_=self.id, _external=True),
-        }
+        return serialize(self, fields, expand)
 
     def __repr__(self):
         """String representation."""
         return '<Role %r>' % self.name
 
 
+class PotRollup:
+
+    """
+    The pots brewed and drank in each time bucket, by tea and brewer.
+
+    A pot counts as brewed in the bucket of its brewed_at and as drank in the
+    bucket of its drank_at, which also adds the seconds it lasted to
+    drink_seconds. Pots without a tea or brewer count under id 0. The rows
+    are kept up to date as pots are written, see rollup_pots, so the stats
+    never scan the pots.
+    """
+
+    bucket = db.Column(db.DateTime, primary_key=True)
+    tea_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    brewer_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    brewed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    drank = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    drink_seconds = db.Column(db.Float, nullable=False, default=0, server_default='0')
+
+    @classmethod
+    def bucket_of(cls, column, dialect):
+        """SQL for the start of the bucket of a datetime column, None if the dialect has none."""
+        if dialect == 'postgresql':
+            return db.func.date_trunc(cls.bucket_name, column)
+        if dialect == 'sqlite':
+            # formatted as SQLAlchemy stores datetimes so that they compare equal
+            return db.func.strftime(cls.sqlite_format, column)
+        return None
+
+    @classmethod
+    def rebuild(cls, portable=False):
+        """
+        Recount the rollup from the pots, in one transaction.
+
+        The pots are totalled by one INSERT ... SELECT on PostgreSQL and
+        SQLite. Other databases, or portable, total them in chunks in Python
+        with rollup_pots.
+        """
+        table = cls.__table__
+        dialect = db.engine.dialect.name
+        db.session.execute(table.delete())
+        if portable or cls.bucket_of(Pot.brewed_at, dialect) is None:
+            cls._rebuild_in_python()
+        else:
+            db.session.execute(table.insert().from_select(ROLLUP_COLUMNS, cls._totals(dialect)))
+        send_on_commit(db.session, tables_changed, tables={'pots'})
+        db.session.commit()
+
+    @classmethod
+    def _rebuild_in_python(cls):
+        """Total the pots in chunks with rollup_pots."""
+        pots = Pot.__table__
+        connection = db.session.connection()
+        rows = connection.execute(db.select([
+            pots.c.tea_id, pots.c.brewer_id, pots.c.brewed_at, pots.c.drank_at
+        ]))
+        while True:
+            chunk = rows.fetchmany(ROLLUP_CHUNK_SIZE)
+            if not chunk:
+                break
+            rollup_pots(connection, [event for row in chunk for event in pot_events(dict(row))], [cls])
+
+    @classmethod
+    def _totals(cls, dialect):
+        """A SELECT of the rollup rows totalled from the pots."""
+        pots = Pot.__table__
+        if dialect == 'postgresql':
+            lasted = db.extract('epoch', pots.c.drank_at - pots.c.brewed_at)
+        else:
+            # julianday is only precise to a few microseconds
+            lasted = db.func.round(
+                (db.func.julianday(pots.c.drank_at) - db.func.julianday(pots.c.brewed_at)) * 86400, 3)
+        keys = [
+            db.func.coalesce(pots.c.tea_id, 0).label('tea_id'),
+            db.func.coalesce(pots.c.brewer_id, 0).label('brewer_id'),
+        ]
+        events = db.union_all(
+            db.select([cls.bucket_of(pots.c.brewed_at, dialect).label('bucket')] + keys + [
+                db.literal_column('1').label('brewed'),
+                db.literal_column('0').label('drank'),
+                db.literal_column('0.0').label('drink_seconds'),
+            ]),
+            db.select([cls.bucket_of(pots.c.drank_at, dialect).label('bucket')] + keys + [
+                db.literal_column('0').label('brewed'),
+                db.literal_column('1').label('drank'),
+                lasted.label('drink_seconds'),
+            ]).where(pots.c.drank_at != None),  # NOQA
+        ).alias('events')
+        return db.select(
+            [events.c.bucket, events.c.tea_id, events.c.brewer_id] +
+            [db.func.sum(events.c[name]) for name in ROLLUP_COLUMNS[3:]]
+        ).group_by(events.c.bucket, events.c.tea_id, events.c.brewer_id)
+
+
+class HourlyPotRollup(PotRollup, db.Model):
+
+    """The pots of each hour."""
+
+    __tablename__ = 'pot_rollups_hourly'
+    bucket_name = 'hour'
+    sqlite_format = '%Y-%m-%d %H:00:00.000000'
+
+    @staticmethod
+    def truncate(at):
+        """The start of the hour."""
+        return at.replace(minute=0, second=0, microsecond=0)
+
+
+class DailyPotRollup(PotRollup, db.Model):
+
+    """The pots of each day."""
+
+    __tablename__ = 'pot_rollups_daily'
+    bucket_name = 'day'
+    sqlite_format = '%Y-%m-%d 00:00:00.000000'
+
+    @staticmethod
+    def truncate(at):
+        """The start of the day."""
+        return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+POT_ROLLUPS = {rollup.bucket_name: rollup for rollup in (HourlyPotRollup, DailyPotRollup)}
+
+
 # ------------------------------------------------------------------------------
 # HELPERS
 
+def count_new_pots(connection, pots):
+    """
+    Add the new pots to the pot_count and last_brewed_at of their teas.
+
+    pots is a list of dicts with tea_id and brewed_at. There is one UPDATE
+    per tea and it runs on the connection of the insert, so the counters are
+    committed or rolled back with the pots.
+    """
+    teas = Tea.__table__
+    counts = {}
+    for pot in pots:
+        count, last = counts.get(pot['tea_id'], (0, None))
+        counts[pot['tea_id']] = (count + 1, max(last or pot['brewed_at'], pot['brewed_at']))
+    for tea_id, (count, last) in counts.items():
+        connection.execute(teas.update().where(teas.c.id == tea_id).values(
+            pot_count=teas.c.pot_count + count,
+            last_brewed_at=db.case(
+                [(db.or_(teas.c.last_brewed_at == None, teas.c.last_brewed_at < last), last)],  # NOQA
+                else_=teas.c.last_brewed_at
+            ),
+        ))
+
+
+def pot_events(pot, sign=1):
+    """
+    The rollup events of a pot, a dict with its tea_id, brewer_id, brewed_at
+    and drank_at, as (at, tea_id, brewer_id, brewed, drank, drink_seconds).
+    A sign of -1 takes the pot away.
+    """
+    tea_id, brewer_id = pot['tea_id'] or 0, pot['brewer_id'] or 0
+    events = [(pot['brewed_at'], tea_id, brewer_id, sign, 0, 0.0)]
+    if pot['drank_at'] is not None:
+        events.append(drank_event(pot, pot['drank_at'], sign))
+    return events
+
+
+def drank_event(pot, drank_at, sign=1):
+    """The rollup event of drinking the pot at drank_at."""
+    lasted = (drank_at - pot['brewed_at']).total_seconds()
+    return (drank_at, pot['tea_id'] or 0, pot['brewer_id'] or 0, 0, sign, sign * lasted)
+
+
+ROLLUP_COLUMNS = ('bucket', 'tea_id', 'brewer_id', 'brewed', 'drank', 'drink_seconds')
+# the pots totalled at a time when rebuilding in Python
+ROLLUP_CHUNK_SIZE = 10000
+ROLLUP_UPSERT = (
+    'INSERT INTO {table} (bucket, tea_id, brewer_id, brewed, drank, drink_seconds) '
+    'VALUES (:bucket, :tea_id, :brewer_id, :brewed, :drank, :drink_seconds) '
+    'ON CONFLICT (bucket, tea_id, brewer_id) DO UPDATE SET '
+    'brewed = {table}.brewed + excluded.brewed, '
+    'drank = {table}.drank + excluded.drank, '
+    'drink_seconds = {table}.drink_seconds + excluded.drink_seconds'
+)
+
+
+def rollup_pots(connection, events, rollups=None):
+    """
+    Add the events of pot_events to the rollups, all of them by default.
+
+    The events are totalled by rollup row first, then there is one statement
+    per row on the connection of the pots, so the rollups are committed or
+    rolled back with them. PostgreSQL (9.5 or later) upserts the rows with
+    one executemany per rollup, other databases update and insert the rows
+    which were not there, updating again if another writer inserted the row
+    in between.
+    """
+    for rollup in rollups or POT_ROLLUPS.values():
+        totals = {}
+        for at, tea_id, brewer_id, brewed, drank, drink_seconds in events:
+            key = (rollup.truncate(at), tea_id, brewer_id)
+            total = totals.get(key, (0, 0, 0.0))
+            totals[key] = (total[0] + brewed, total[1] + drank, total[2] + drink_seconds)
+        rows = [
+            dict(zip(ROLLUP_COLUMNS, key + total))
+            for key, total in totals.items() if any(total)
+        ]
+        if not rows:
+            continue
+        table = rollup.__table__
+        if connection.dialect.name == 'postgresql':
+            connection.execute(db.text(ROLLUP_UPSERT.format(table=table.name)), rows)
+            continue
+        for row in rows:
+            update = table.update().where(db.and_(
+                table.c.bucket == row['bucket'],
+                table.c.tea_id == row['tea_id'],
+                table.c.brewer_id == row['brewer_id'],
+            )).values(
+                brewed=table.c.brewed + row['brewed'],
+                drank=table.c.drank + row['drank'],
+                drink_seconds=table.c.drink_seconds + row['drink_seconds'],
+            )
+            if connection.execute(update).rowcount:
+                continue
+            try:
+                connection.execute(table.insert(), row)
+            except IntegrityError:
+                connection.execute(update)
+
+
+def _pot_values(pot):
+    return {
+        'tea_id': pot.tea_id,
+        'brewer_id': pot.brewer_id,
+        'brewed_at': pot.brewed_at,
+        'drank_at': pot.drank_at,
+    }
+
+
+def render_markdown(target, value, field):
+    """Store the html of a markdown field in its _html column."""
+    setattr(target, field + '_html', markdown(value) if value else None)
+
+
+def _markdown_listener(field):
+    def on_set(target, value, oldvalue, initiator):
+        render_markdown(target, value, field)
+    return on_set
+
+for _field in Tea.markdown_fields:
+    event.listen(getattr(Tea, _field), 'set', _markdown_listener(_field))
+
+
+@event.listens_for(Pot, 'after_insert')
+def _count_new_pot(mapper, connection, pot):
+    count_new_pots(connection, [{'tea_id': pot.tea_id, 'brewed_at': pot.brewed_at}])
+    rollup_pots(connection, pot_events(_pot_values(pot)))
+
+
+@event.listens_for(Pot, 'after_update')
+def _rollup_changed_pot(mapper, connection, pot):
+    # take the pot out of the rows of its old values and add it to the new ones
+    new = _pot_values(pot)
+    old = dict(new)
+    for key in old:
+        history = get_history(pot, key)
+        if history.has_changes():
+            old[key] = history.deleted[0] if history.deleted else None
+    if old != new:
+        rollup_pots(connection, pot_events(old, -1) + pot_events(new))
+
+
+@event.listens_for(Pot, 'after_delete')
+def _uncount_pot(mapper, connection, pot):
+    # the pot may have been the last brewed, so look up the latest of the rest
+    teas, pots = Tea.__table__, Pot.__table__
+    connection.execute(teas.update().where(teas.c.id == pot.tea_id).values(
+        pot_count=teas.c.pot_count - 1,
+        last_brewed_at=db.select([db.func.max(pots.c.brewed_at)]).where(
+            pots.c.tea_id == teas.c.id).as_scalar(),
+    ))
+    rollup_pots(connection, pot_events(_pot_values(pot), -1))
+
+
 def from_json_helper(data, model, form_class):
     """For a given MultiDict data, create a model using the repective form_class."""
     form = form_class(MultiDict(data), csrf_enabled=False)
@@ -0,0 +1,142 @@
+"""
+A bounded outbox of emails delivered by a small pool of worker threads.
+
+Requests put their messages in the outbox and return straight away. Each
+worker takes what is waiting, up to a batch, and sends it over one SMTP
+connection, retrying with a growing delay when the server cannot be
+reached. When the outbox is full, putting blocks for a moment and then
+gives up, so a dead mail server slows the requests that send email a little
+instead of piling up messages (and threads) without limit.
+
+To watch the emails locally run a debugging server, for example
+`python -m aiosmtpd -n -l localhost:1025`, and point MAIL_SERVER and
+MAIL_PORT at it with MAIL_USE_SSL off.
+"""
+
+import atexit
+import logging
+import smtplib
+import time
+from queue import Queue, Empty
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class MailOutbox:
+
+    """Deliver emails in the background over reused SMTP connections."""
+
+    def __init__(self, app=None):
+        """Set up the outbox, optionally for the app straight away."""
+        self._lock = Lock()
+        self._workers = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the settings and deliver what is left when the process exits."""
+        self.app = app
+        self.queue = Queue(app.config['TEAFLASK_MAIL_QUEUE_SIZE'])
+        self._workers = []
+        self.workers = app.config['TEAFLASK_MAIL_WORKERS']
+        self.put_timeout = app.config['TEAFLASK_MAIL_PUT_TIMEOUT']
+        self.batch_size = app.config['TEAFLASK_MAIL_BATCH_SIZE']
+        self.linger = app.config['TEAFLASK_MAIL_LINGER']
+        self.retries = app.config['TEAFLASK_MAIL_RETRIES']
+        self.retry_delay = app.config['TEAFLASK_MAIL_RETRY_DELAY']
+        app.extensions['outbox'] = self
+        atexit.register(self.flush, app.config['TEAFLASK_MAIL_EXIT_TIMEOUT'])
+
+    def put(self, msg):
+        """
+        Queue the message for delivery.
+
+        Raises queue.Full when the outbox stays full for put_timeout seconds.
+        """
+        self._start()
+        self.queue.put(msg, timeout=self.put_timeout)
+
+    def flush(self, timeout=None):
+        """Wait until the queued messages are delivered, return whether they were."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _start(self):
+        with self._lock:
+            while len(self._workers) < self.workers:
+                worker = Thread(
+                    target=self._run,
+                    name='teaflask-mail-{}'.format(len(self._workers)),
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _take(self):
+        """Block for a message, then take whatever else arrives within linger."""
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get(timeout=self.linger))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            try:
+                with self.app.app_context():
+                    self.deliver(batch)
+            except Exception:
+                logger.exception('Could not deliver %d emails', len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def deliver(self, batch):
+        """
+        Send the messages over one connection, return how many were sent.
+
+        When the connection fails the unsent messages are tried again on a new
+        connection after retry_delay, doubling each time, and are dropped with
+        an error after the last retry. A message the server refuses outright,
+        its recipients, its sender or a 5xx reply to its data, is dropped
+        straight away as sending it again would not help, and the rest of the
+        batch carries on over the same connection.
+        """
+        from . import mail
+        pending = list(batch)
+        sent = 0
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                with mail.connect() as connection:
+                    while pending:
+                        try:
+                            connection.send(pending[0])
+                            sent += 1
+                        except smtplib.SMTPRecipientsRefused:
+                            logger.exception('Email to %s refused', pending[0].recipients)
+                        except smtplib.SMTPResponseException as e:
+                            if not 500 <= e.smtp_code < 600:
+                                raise
+                            logger.exception('Email to %s refused', pending[0].recipients)
+                        pending.pop(0)
+                return sent
+            except (smtplib.SMTPException, OSError):
+                logger.warning(
+                    'Could not send %d emails (attempt %d)', len(pending), attempt + 1,
+                    exc_info=True
+                )
+        logger.error('Gave up on %d emails to %s', len(pending), [m.recipients for m in pending])
+        return sent
+
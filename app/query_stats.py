@@ -0,0 +1,104 @@
+"""
+Instrumentation of the SQL statements run by the app.
+
+Engine events time every statement. Statements slower than
+TEAFLASK_SLOW_DB_QUERY_TIME are logged with the endpoint, parameters and
+duration, and every endpoint keeps a count of its requests, statements and
+database time. A request which runs more than
+TEAFLASK_MAX_QUERIES_PER_REQUEST statements is logged too, which is how an
+N+1 query in a listing shows up.
+"""
+
+import logging
+import reprlib
+import time
+from threading import Lock
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# parameters are logged shortened, a bulk insert can have thousands
+_params_repr = reprlib.Repr()
+_params_repr.maxlist = _params_repr.maxtuple = _params_repr.maxdict = 10
+_params_repr.maxstring = _params_repr.maxother = 80
+
+
+class QueryStats:
+
+    """Time the SQL statements and total them by endpoint."""
+
+    def __init__(self, app=None):
+        """Set up the totals, optionally for the app straight away."""
+        self._lock = Lock()
+        self._endpoints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Listen to every engine and count the statements of each request."""
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(_start_request)
+        app.after_request(self._end_request)
+        app.extensions['query_stats'] = self
+
+    def _end_request(self, response):
+        queries = g.get('query_count', 0)
+        duration = g.get('query_time', 0.0)
+        endpoint = request.endpoint or 'none'
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'time': 0.0, 'max_queries': 0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += queries
+            stats['time'] += duration
+            stats['max_queries'] = max(stats['max_queries'], queries)
+        if queries > current_app.config['TEAFLASK_MAX_QUERIES_PER_REQUEST']:
+            logger.warning(
+                '%d queries taking %.3fs for %s %s (%s)',
+                queries, duration, request.method, request.full_path, endpoint
+            )
+        return response
+
+    def stats(self):
+        """The totals of each endpoint, with the mean queries and time per request."""
+        with self._lock:
+            endpoints = {name: dict(stats) for name, stats in self._endpoints.items()}
+        for stats in endpoints.values():
+            stats['mean_queries'] = stats['queries'] / stats['requests']
+            stats['mean_time'] = stats['time'] / stats['requests']
+        return endpoints
+
+    def reset(self):
+        """Forget the totals."""
+        with self._lock:
+            self._endpoints.clear()
+
+
+def _start_request():
+    g.query_count = 0
+    g.query_time = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.time() - conn.info['query_start_time'].pop()
+    if not has_app_context():
+        return
+    endpoint = None
+    if has_request_context():
+        endpoint = request.endpoint
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_time = g.get('query_time', 0.0) + duration
+    if duration >= current_app.config['TEAFLASK_SLOW_DB_QUERY_TIME']:
+        logger.warning(
+            'Slow query taking %.3fs in %s: %s with %s',
+            duration, endpoint or 'the background', statement, _params_repr.repr(parameters)
+        )
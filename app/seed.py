@@ -0,0 +1,158 @@
+"""
+A generator of synthetic teas, brewers and pots at production scale.
+
+The rows are written with Core executemany inserts, or COPY on PostgreSQL,
+in chunks, bypassing the ORM and its events, so the tea counters and the pot
+rollups are rebuilt once at the end. Every brewer's password is their
+username, hashed in a process pool as the PBKDF2 hashes are most of the cost
+of the brewers.
+
+Pots are brewed during working hours on weekdays, with random gaps between
+them, and the teas are brewed with a long tail of popularity. Every pot but
+the newest few is drank DRINK_MINUTES after it was brewed.
+"""
+
+import csv
+import io
+import random
+from bisect import bisect
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import accumulate
+from werkzeug.security import generate_password_hash
+from . import db
+from .models import POT_ROLLUPS, Brewer, Pot, Role, Tea
+from .signals import send_on_commit, tables_changed
+
+IMAGE_URL = 'images/tea/missing_pot.png'
+CATEGORIES = ('black', 'green', 'oolong', 'white', 'herbal', 'rooibos', 'pu-erh')
+LOCATIONS = ('Kitchen', 'Top shelf', 'Desk drawer', 'Tin', 'Cupboard')
+# the working day in which pots are brewed, and how long they last
+DAY_START = timedelta(hours=8)
+DAY_LENGTH = timedelta(hours=10)
+DRINK_MINUTES = (5, 90)
+UNDRUNK = 3
+CHUNK_SIZE = 50000
+HASH_CHUNK_SIZE = 64
+
+
+def working_time(start, offset):
+    """The time offset seconds of working hours after the monday start."""
+    day = int(offset // DAY_LENGTH.total_seconds())
+    seconds = offset % DAY_LENGTH.total_seconds()
+    weeks, weekday = divmod(day, 5)
+    return start + timedelta(days=weeks * 7 + weekday, seconds=seconds) + DAY_START
+
+
+def weighted_chooser(rng, values, weights):
+    """A function which picks one of the values in proportion to their weights."""
+    cumulative = list(accumulate(weights))
+    total = cumulative[-1]
+    return lambda: values[bisect(cumulative, rng.random() * total)]
+
+
+def hash_passwords(passwords, workers=None):
+    """The hashes of the passwords, made in a pool of processes."""
+    if workers == 1:
+        return [generate_password_hash(password) for password in passwords]
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(generate_password_hash, passwords, chunksize=HASH_CHUNK_SIZE))
+
+
+def insert_rows(connection, table, columns, rows):
+    """Insert the rows, tuples of the columns, with COPY or an executemany."""
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert('COPY {} ({}) FROM STDIN WITH CSV'.format(
+                table.name, ', '.join(columns)), buffer)
+        finally:
+            cursor.close()
+    else:
+        connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+def generate_pots(rng, count, tea_ids, brewer_ids, start, end):
+    """Yield (tea_id, brewer_id, brewed_at, drank_at) for the pots, oldest first."""
+    weeks = (end - start).days / 7
+    working_seconds = weeks * 5 * DAY_LENGTH.total_seconds()
+    mean_gap = working_seconds / max(count, 1)
+    # a few teas are brewed far more often than the rest
+    pick_tea = weighted_chooser(rng, tea_ids, [1 / rank for rank in range(1, len(tea_ids) + 1)])
+    pick_brewer = weighted_chooser(
+        rng, brewer_ids, [rng.paretovariate(1.5) for _ in brewer_ids]
+    )
+    offset = 0.0
+    for i in range(count):
+        offset = min(offset + rng.expovariate(1 / mean_gap), working_seconds)
+        brewed_at = working_time(start, offset)
+        drank_at = None
+        if i < count - UNDRUNK:
+            drank_at = brewed_at + timedelta(minutes=rng.randint(*DRINK_MINUTES))
+        yield pick_tea(), pick_brewer(), brewed_at, drank_at
+
+
+def seed_database(teas, brewers, pots, years=5, seed=0, end=None, workers=None):
+    """
+    Add the teas, brewers and pots, brewed over the years before end.
+
+    The rows only depend on the arguments, end defaults to the start of
+    today. The brewers are named brewer0, brewer1 and so on.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=365 * years)
+    # start on a monday so that working_time lines up with the weekdays
+    start -= timedelta(days=start.weekday())
+    Role.insert_roles()
+    role_id = Role.default_role().id
+    connection = db.session.connection()
+
+    insert_rows(connection, Tea.__table__, ('name', 'category', 'location', 'image_url'), [
+        ('Tea {}'.format(i), rng.choice(CATEGORIES), rng.choice(LOCATIONS), IMAGE_URL)
+        for i in range(teas)
+    ])
+
+    usernames = ['brewer{}'.format(i) for i in range(brewers)]
+    hashes = hash_passwords(usernames, workers)
+    for chunk in range(0, brewers, CHUNK_SIZE):
+        insert_rows(
+            connection, Brewer.__table__,
+            ('email', 'username', 'password_hash', 'role_id', 'confirmed', 'member_since', 'last_seen'),
+            [
+                (username + '@example.com', username, password_hash, role_id, True, start, end)
+                for username, password_hash in zip(
+                    usernames[chunk:chunk + CHUNK_SIZE], hashes[chunk:chunk + CHUNK_SIZE])
+            ]
+        )
+
+    tea_ids = [id_ for id_, in db.session.query(Tea.id).order_by(Tea.id)]
+    brewer_ids = [id_ for id_, in db.session.query(Brewer.id).order_by(Brewer.id)]
+    rows = []
+    for row in generate_pots(rng, pots, tea_ids, brewer_ids, start, end):
+        rows.append(row)
+        if len(rows) == CHUNK_SIZE:
+            insert_rows(connection, Pot.__table__, ('tea_id', 'brewer_id', 'brewed_at', 'drank_at'), rows)
+            rows = []
+    if rows:
+        insert_rows(connection, Pot.__table__, ('tea_id', 'brewer_id', 'brewed_at', 'drank_at'), rows)
+
+    send_on_commit(db.session, tables_changed, tables={'teas', 'brewers', 'pots'})
+    db.session.commit()
+    Tea.rebuild_counters()
+    for rollup in POT_ROLLUPS.values():
+        rollup.rebuild()
+
+
+def dataset():
+    """The sizes of the dataset in the database."""
+    return {
+        'teas': Tea.query.count(),
+        'brewers': Brewer.query.count(),
+        'pots': Pot.query.count(),
+    }
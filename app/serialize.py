@@ -0,0 +1,106 @@
+"""
+Field by field serialization of the models.
+
+Each model lists its json fields in json_fields, with the columns and
+relationships each field reads. That lets a client ask for some of the fields
+(?fields=) and have related objects embedded (?expand=), and lets the query
+load exactly what those fields read: the columns with load_only and the
+relationships joined in the same SELECT.
+"""
+
+from collections import namedtuple
+from operator import attrgetter
+from sqlalchemy.orm import joinedload, load_only
+
+
+class JsonField(namedtuple('JsonField', 'get columns relationship related_columns expand default')):
+
+    """
+    A field of a model's json.
+
+    get(obj, expand) returns the value. The field reads the columns of the
+    object and, through relationship, the related_columns of the related
+    object. An expand field embeds the whole related object when it is in
+    expand. Fields which are not default are only given when asked for.
+    """
+
+    def __new__(cls, get, columns, relationship=None, related_columns=(), expand=False, default=True):
+        """Give the optional parts their defaults."""
+        return super(JsonField, cls).__new__(
+            cls, get, columns, relationship, related_columns, expand, default
+        )
+
+
+def column(name, default=True):
+    """A field which is the value of a column."""
+    get = attrgetter(name)
+    return JsonField(lambda obj, expand: get(obj), (name,), default=default)
+
+
+def related(relationship, key, url):
+    """A field which is the url of a related object, or the object when expanded."""
+    def get(obj, expand):
+        if relationship in expand:
+            value = getattr(obj, relationship)
+            return value.to_json() if value is not None else None
+        return url(getattr(obj, key))
+    return JsonField(get, (key,), relationship, expand=True)
+
+
+def default_fields(model):
+    """The names of the fields given when none are asked for."""
+    return [name for name, field in model.json_fields.items() if field.default]
+
+
+def serialize(obj, fields=None, expand=()):
+    """The json dict of obj with the fields asked for, or the default ones."""
+    json_fields = type(obj).json_fields
+    if fields is None:
+        fields = default_fields(type(obj))
+    return {name: json_fields[name].get(obj, expand) for name in fields}
+
+
+def related_loads(model, fields, expand):
+    """
+    The relationships the fields read, mapped to the related columns they
+    read or None when the whole related object is embedded.
+    """
+    related = {}
+    for name in fields:
+        field = model.json_fields[name]
+        if field.relationship is None:
+            continue
+        if name in expand:
+            related[field.relationship] = None
+        elif field.related_columns and related.get(field.relationship, ()) is not None:
+            related[field.relationship] = \
+                set(related.get(field.relationship, ())) | set(field.related_columns)
+    return related
+
+
+def load_options(model, fields=None, expand=(), columns=()):
+    """
+    The loader options for a query whose results are serialized.
+
+    columns are any others that need loading, for example to order by.
+    """
+    options = []
+    if fields is not None:
+        options.append(load_only(*(set(columns) | {
+            name for field in fields for name in model.json_fields[field].columns
+        })))
+    else:
+        fields = default_fields(model)
+
+    for relationship, related_columns in related_loads(model, fields, expand).items():
+        loader = joinedload(relationship)
+        if related_columns is not None:
+            options.append(loader.load_only(*related_columns))
+            continue
+        # an embedded object is serialized with its default fields
+        related_model = getattr(model, relationship).property.mapper.class_
+        nested = related_loads(related_model, default_fields(related_model), ())
+        for nested_relationship, nested_columns in nested.items():
+            options.append(loader.joinedload(nested_relationship).load_only(*nested_columns))
+        options.append(loader)
+    return options
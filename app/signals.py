@@ -0,0 +1,86 @@
+"""
+Signals sent when pots, brewers and tables are committed.
+
+Session events note what happened during each flush and the signals are only
+sent once the transaction commits, so receivers never act on rows that get
+rolled back. Pot receivers get a plain dict rather than the Pot so they can
+keep it after the session is gone.
+"""
+
+from blinker import Namespace
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+_signals = Namespace()
+
+pot_brewed = _signals.signal('pot-brewed')
+pot_drank = _signals.signal('pot-drank')
+# many pots were inserted at once, sent with pots, a list of their dicts
+# without ids, instead of a pot_brewed for each
+pots_brewed = _signals.signal('pots-brewed')
+# the password or permissions of a brewer changed, sent with brewer_id which
+# is None when the permissions of a whole role changed
+credentials_changed = _signals.signal('credentials-changed')
+# rows of the tables were written, sent with the set of table names
+tables_changed = _signals.signal('tables-changed')
+
+_PENDING = 'teaflask_signals'
+
+
+def pot_snapshot(pot):
+    """The fields of a pot that are sent with the signals."""
+    return {
+        'id': pot.id,
+        'tea_id': pot.tea_id,
+        'brewer_id': pot.brewer_id,
+        'brewed_at': pot.brewed_at,
+        'drank_at': pot.drank_at,
+    }
+
+
+def send_on_commit(session, signal, **kwargs):
+    """Send signal with the kwargs once session commits."""
+    session.info.setdefault(_PENDING, []).append((signal, kwargs))
+
+
+def _changed(obj, *keys):
+    return any(get_history(obj, key).has_changes() for key in keys)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    from .models import Brewer, Pot, Role
+    for obj in session.new:
+        if isinstance(obj, Pot):
+            send_on_commit(session, pot_brewed, pot=pot_snapshot(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Pot) and any(get_history(obj, 'drank_at').added):
+            send_on_commit(session, pot_drank, pot=pot_snapshot(obj))
+        elif isinstance(obj, Brewer) and _changed(obj, 'password_hash', 'role', 'role_id'):
+            send_on_commit(session, credentials_changed, brewer_id=obj.id)
+        elif isinstance(obj, Role) and _changed(obj, 'permissions'):
+            send_on_commit(session, credentials_changed, brewer_id=None)
+    for obj in session.deleted:
+        if isinstance(obj, Brewer):
+            send_on_commit(session, credentials_changed, brewer_id=obj.id)
+
+    tables = {
+        obj.__table__.name
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if hasattr(obj, '__table__')
+    }
+    if tables:
+        send_on_commit(session, tables_changed, tables=tables)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    sender = getattr(session, 'app', None)
+    for signal, kwargs in session.info.pop(_PENDING, []):
+        signal.send(sender, **kwargs)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
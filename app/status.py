@@ -0,0 +1,75 @@
+"""
+The cached state of the status screen.
+
+The status screen shows the newest pot which has not been drank and the most
+recent pots. Only new pots and drinking a pot change that, so it is loaded
+once and kept until the pot signals say it changed. The version stamp tells
+every gunicorn worker when another one has invalidated it.
+"""
+
+import os
+from sqlalchemy.orm import Session, joinedload
+from .cache import TTLCache, VersionStamp
+from .signals import pot_brewed, pot_drank, pots_brewed
+
+
+class StatusCache:
+
+    """Hold the current pot and the recent pots for the status screen."""
+
+    def __init__(self, app=None):
+        """Set up the cache, optionally for the app straight away."""
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the settings and listen for changes to pots."""
+        self.recent = app.config['TEAFLASK_STATUS_RECENT_POTS']
+        self.stamp = VersionStamp(os.path.join(app.config['TEAFLASK_STATE_DIR'], 'pots'))
+        # keyed by the version it was loaded at, so a load racing an
+        # invalidation is never read back; /metrics counts its hits
+        self.cache = TTLCache(1, app.config['TEAFLASK_STATUS_CACHE_TTL'])
+        app.extensions['status_pots'] = self.cache
+        pot_brewed.connect(self._on_pot_changed, weak=False)
+        pot_drank.connect(self._on_pot_changed, weak=False)
+        pots_brewed.connect(self._on_pot_changed, weak=False)
+        app.extensions['status_cache'] = self
+
+    def get(self):
+        """Return the newest undrunk pot (or None) and the recent pots."""
+        version = self.stamp.current()
+        status = self.cache.get(version)
+        if status is None:
+            status = self._load()
+            self.cache.set(version, status)
+        return status
+
+    def invalidate(self):
+        """Forget the status in this worker and tell the others to."""
+        self.cache.invalidate()
+        self.stamp.bump()
+
+    def _on_pot_changed(self, sender, **kwargs):
+        self.invalidate()
+
+    def _load(self):
+        """
+        Load the pots with their tea and brewer in a private session.
+
+        Closing the session without committing leaves the pots detached with
+        everything the templates read already loaded, so they are safe to
+        share between requests.
+        """
+        from . import db
+        from .models import Pot
+        session = Session(bind=db.engine)
+        try:
+            query = session.query(Pot).options(
+                joinedload('tea'),
+                joinedload('brewer'),
+            ).order_by(Pot.brewed_at.desc())
+            pot = query.filter(Pot.drank_at == None).first()  # NOQA
+            pots = query.limit(self.recent).all()
+        finally:
+            session.close()
+        return pot, pots
@@ -1,7 +1,16 @@
 """Package level tests."""
 
+import json
 import unittest
+from base64 import b64encode
+from types import SimpleNamespace
+from flask import url_for
+from flask.ext.mail import Message, email_dispatched
+from flask.ext.sqlalchemy import get_debug_queries
 from . import api_1_0, auth, main, decorators, email, exceptions, models
+from . import create_app, db, mail, outbox
+from .models import Brewer, Permission, Pot, Role, Tea
+from .urls import build_url
 
 
 class MainTestCase(unittest.TestCase):
@@ -11,3 +20,544 @@ class MainTestCase(unittest.TestCase):
     def test_add(self):
         """Assert that we can add."""
         self.assertEqual(2, 1 + 1)
+
+
+class UrlsTestCase(unittest.TestCase):
+
+    """Tests for the precompiled API urls."""
+
+    def test_build_url_matches_url_for(self):
+        """build_url gives the same urls as url_for for every url root."""
+        app = create_app('testing')
+        endpoints = [
+            rule.endpoint for rule in app.url_map.iter_rules()
+            if rule.endpoint.startswith('api.') and rule.arguments == {'id_'}
+        ]
+        self.assertIn('api.get_pot', endpoints)
+        for base_url in ('http://localhost/', 'https://tea.example.com:8443/office/'):
+            with app.test_request_context('/', base_url=base_url):
+                for endpoint in endpoints:
+                    for id_ in (1, 42, 1234567):
+                        self.assertEqual(
+                            build_url(endpoint, id_),
+                            url_for(endpoint, id_=id_, _external=True)
+                        )
+
+
+class MailTestCase(unittest.TestCase):
+
+    """Tests for the background mail outbox."""
+
+    def test_outbox_delivers_in_background(self):
+        """send_email returns before delivery and the outbox sends every email."""
+        app = create_app('testing')
+        app.config.update(MAIL_USERNAME='user', MAIL_PASSWORD='secret')
+        sent = []
+
+        def record(message, app):
+            sent.append(message.recipients)
+
+        email_dispatched.connect(record)
+        try:
+            with app.test_request_context('/'):
+                for i in range(5):
+                    email.send_email(
+                        '{}@example.com'.format(i),
+                        'Confirm Your Account',
+                        'auth/email/confirm',
+                        user=SimpleNamespace(username='brewer{}'.format(i)),
+                        token='token'
+                    )
+            self.assertTrue(outbox.flush(timeout=10))
+        finally:
+            email_dispatched.disconnect(record)
+        self.assertEqual(sorted(sent), [['{}@example.com'.format(i)] for i in range(5)])
+
+    def test_outbox_drops_refused_messages(self):
+        """A message the server rejects is dropped and the rest of the batch is still sent."""
+        import smtplib
+        from unittest import mock
+        app = create_app('testing')
+        sent = []
+
+        def send(message):
+            if message.recipients == ['bad@example.com']:
+                raise smtplib.SMTPDataError(554, b'Message rejected')
+            sent.append(message.recipients)
+
+        connection = mock.MagicMock()
+        connection.__enter__.return_value.send.side_effect = send
+        messages = [
+            Message('Hi', sender='admin@example.com', recipients=[to])
+            for to in ('one@example.com', 'bad@example.com', 'two@example.com')
+        ]
+        with app.app_context(), mock.patch.object(mail, 'connect', return_value=connection), \
+                self.assertLogs('app.outbox', 'ERROR'):
+            self.assertEqual(outbox.deliver(messages), 2)
+        self.assertEqual(sent, [['one@example.com'], ['two@example.com']])
+        self.assertEqual(connection.__enter__.call_count, 1)
+
+
+class GreenTestCase(unittest.TestCase):
+
+    """Tests for the cooperative psycopg2 of the eventlet workers."""
+
+    def setUp(self):
+        """Skip unless the testing database is PostgreSQL and eventlet is installed."""
+        self.uri = create_app('testing').config['SQLALCHEMY_DATABASE_URI']
+        if not self.uri.startswith('postgresql'):
+            self.skipTest('needs TEST_DATABASE_URL to be a PostgreSQL database')
+        try:
+            import eventlet  # NOQA
+            import psycopg2  # NOQA
+        except ImportError:
+            self.skipTest('needs eventlet and psycopg2')
+
+    def test_slow_queries_run_concurrently(self):
+        """Slow queries in separate greenlets overlap instead of running one after another."""
+        import time
+        import eventlet
+        from psycopg2 import extensions
+        from sqlalchemy import create_engine
+        from .green import patch_psycopg2
+        patch_psycopg2()
+        try:
+            engine = create_engine(self.uri, pool_size=4)
+            pool = eventlet.GreenPool()
+            start = time.time()
+            for _ in range(4):
+                pool.spawn(engine.execute, 'SELECT pg_sleep(0.5)')
+            pool.waitall()
+            elapsed = time.time() - start
+            engine.dispose()
+        finally:
+            extensions.set_wait_callback(None)
+        # one after another they would take 2 seconds
+        self.assertLess(elapsed, 1.5)
+
+
+class ApiTestCase(unittest.TestCase):
+
+    """Tests for the json api against the testing database."""
+
+    def setUp(self):
+        """Create the app and an empty database."""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        brewer = Brewer(email='brewer@example.com', username='brewer', password='cat')
+        db.session.add(brewer)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        """Drop the database."""
+        self.app.extensions['last_seen'].flush()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_headers(self, username='brewer', password='cat'):
+        """Basic auth headers, for the test brewer by default."""
+        credentials = '{}:{}'.format(username, password).encode('utf-8')
+        return {
+            'Authorization': 'Basic ' + b64encode(credentials).decode('utf-8'),
+            'Accept': 'application/json',
+        }
+
+    def add_pots(self, count):
+        """Add pots which each have their own tea and brewer."""
+        start = Pot.query.count()
+        for i in range(start, start + count):
+            tea = Tea(name='tea {}'.format(i), category='black')
+            brewer = Brewer(email='{}@example.com'.format(i), username='brewer{}'.format(i))
+            db.session.add(Pot(tea=tea, brewer=brewer))
+        db.session.commit()
+        # start the requests with an empty identity map
+        db.session.remove()
+
+    def count_queries(self, url):
+        """Get the url and return the number of SQL statements it ran."""
+        # like a new request in the server, with nothing in the identity map
+        db.session.remove()
+        before = len(get_debug_queries())
+        response = self.client.get(url, headers=self.get_headers())
+        self.assertEqual(response.status_code, 200)
+        return len(get_debug_queries()) - before
+
+    def test_pots_page_query_count(self):
+        """A page of pots costs the same number of queries whatever its size."""
+        self.add_pots(3)
+        # authenticate once so that the counts pay the same for it
+        self.count_queries('/api/v1/pots/?limit=2')
+        # both pages are full and followed by more pots, so both are counted
+        few = self.count_queries('/api/v1/pots/?limit=2')
+        self.add_pots(20)
+        many = self.count_queries('/api/v1/pots/?limit=20')
+        self.assertEqual(few, many)
+
+        cursor_few = self.count_queries('/api/v1/pots/?cursor=&limit=2')
+        cursor_many = self.count_queries('/api/v1/pots/?cursor=&limit=20')
+        self.assertEqual(cursor_few, cursor_many)
+
+    def test_credentials_cache(self):
+        """Verified credentials are reused, and forgotten when the brewer changes."""
+        credentials = self.app.extensions['api_credentials']
+        self.count_queries('/api/v1/pots/')
+        self.assertEqual(self.count_queries('/api/v1/pots/'), self.count_queries('/api/v1/pots/'))
+        self.assertEqual(credentials.stats()['size'], 1)
+        self.assertGreaterEqual(credentials.stats()['hits'], 2)
+        response = self.client.get('/api/v1/pots/', headers=self.get_headers(password='dog'))
+        self.assertEqual(response.status_code, 401)
+
+        brewer = Brewer.query.filter_by(username='brewer').first()
+        brewer.password = 'dog'
+        db.session.commit()
+        self.assertEqual(credentials.stats()['size'], 0)
+        response = self.client.get('/api/v1/pots/', headers=self.get_headers())
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/api/v1/pots/', headers=self.get_headers(password='dog'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_credentials_cache_role_change(self):
+        """A cached brewer gets the permissions of a new role straight away."""
+        headers = self.get_headers()
+        self.assertEqual(self.client.get('/api/v1/auth/stats', headers=headers).status_code, 403)
+        brewer = Brewer.query.filter_by(username='brewer').first()
+        brewer.role = Role.query.filter_by(name='Administrator').first()
+        db.session.commit()
+        self.assertEqual(self.client.get('/api/v1/auth/stats', headers=headers).status_code, 200)
+
+        administrator = Role.query.filter_by(name='Administrator').first()
+        administrator.permissions = Permission.DRINK
+        db.session.commit()
+        self.assertEqual(self.client.get('/api/v1/auth/stats', headers=headers).status_code, 403)
+
+    def test_tokens(self):
+        """A token is issued for a password and authenticates until it expires."""
+        response = self.client.post('/api/v1/tokens', headers=self.get_headers())
+        self.assertEqual(response.status_code, 201)
+        token = json.loads(response.get_data(as_text=True))['token']
+        bearer = {'Authorization': 'Bearer ' + token, 'Accept': 'application/json'}
+        self.assertEqual(self.client.get('/api/v1/pots/', headers=bearer).status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/pots/', headers=bearer).status_code, 200)
+        # a token cannot be traded for another one
+        self.assertEqual(self.client.post('/api/v1/tokens', headers=bearer).status_code, 401)
+
+        with self.app.test_request_context('/'):
+            expired = Brewer.query.filter_by(username='brewer').first().generate_auth_token(-10)
+        for token in (expired, 'nonsense'):
+            response = self.client.get('/api/v1/pots/', headers={'Authorization': 'Bearer ' + token})
+            self.assertEqual(response.status_code, 401)
+
+    def test_cached_brewer_is_not_stale(self):
+        """Edits to the authenticated brewer show up although the brewer is cached."""
+        url = '/api/v1/brewers/{}/'.format(Brewer.query.filter_by(username='brewer').first().id)
+        response = self.client.get(url, headers=self.get_headers())
+        self.assertEqual(response.status_code, 200)
+        # the request removed the session, so load the brewer again
+        brewer = Brewer.query.filter_by(username='brewer').first()
+        brewer.name = 'Earl Grey'
+        db.session.commit()
+        response = self.client.get(url, headers=self.get_headers())
+        self.assertEqual(json.loads(response.get_data(as_text=True))['name'], 'Earl Grey')
+
+    def test_bulk_pots(self):
+        """A list of pots gets a result per item and one pots_brewed signal."""
+        from .signals import pot_brewed, pots_brewed
+        self.add_pots(1)
+        tea_id = Tea.query.first().id
+        received = []
+
+        def record(sender, **kwargs):
+            received.append(kwargs)
+
+        pot_brewed.connect(record)
+        pots_brewed.connect(record)
+        try:
+            response = self.client.post('/api/v1/pots/', headers=self.get_headers(), data=json.dumps([
+                {'tea_id': tea_id},
+                {'tea_id': tea_id, 'brewed_at': '2015-10-19 09:00:00', 'drank_at': '2015-10-19 09:30:00'},
+                {'tea_id': tea_id + 100},
+                {'tea_id': [tea_id]},
+                {'tea_id': True},
+                {'tea_id': tea_id, 'brewed_at': 'yesterday'},
+                'pot',
+            ]), content_type='application/json')
+        finally:
+            pot_brewed.disconnect(record)
+            pots_brewed.disconnect(record)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual([result['status'] for result in data['results']], [201, 201, 400, 400, 400, 400, 400])
+        self.assertEqual((data['created'], data['failed']), (2, 5))
+        self.assertEqual(Tea.query.get(tea_id).pot_count, 3)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(received[0]['pots']), 2)
+
+        response = self.client.post(
+            '/api/v1/pots/', headers=self.get_headers(), data=json.dumps([{'tea_id': 'x'}]),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        """Unchanged responses are 304s, and last_seen only changes the brewers' validators."""
+        from . import last_seen
+        self.add_pots(1)
+        brewer_url = '/api/v1/brewers/{}/'.format(Brewer.query.filter_by(username='brewer').first().id)
+
+        def get(url, etag=None):
+            headers = self.get_headers()
+            if etag is not None:
+                headers['If-None-Match'] = etag
+            response = self.client.get(url, headers=headers)
+            return response.status_code, response.headers.get('ETag')
+
+        response = self.client.get('/api/v1/pots/', headers=dict(
+            self.get_headers(), **{'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}))
+        # the pots were written within the second, so only the ETag is valid
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response.headers)
+
+        pots_etag = get('/api/v1/pots/')[1]
+        brewer_etag = get(brewer_url)[1]
+        self.assertEqual(get('/api/v1/pots/', pots_etag)[0], 304)
+        self.assertEqual(get(brewer_url, brewer_etag)[0], 304)
+        # the 304 of a tea's pots is answered before the tea is looked up
+        tea_pots_url = '/api/v1/teas/{}/pots/'.format(Tea.query.first().id)
+        tea_pots_etag = get(tea_pots_url)[1]
+        before = len(get_debug_queries())
+        self.assertEqual(get(tea_pots_url, tea_pots_etag)[0], 304)
+        self.assertEqual(len(get_debug_queries()), before)
+
+        interval, last_seen.interval = last_seen.interval, 0
+        try:
+            last_seen.touch(Brewer.query.filter_by(username='brewer').first().id)
+            self.assertEqual(last_seen.flush(), 1)
+        finally:
+            last_seen.interval = interval
+        self.assertEqual(get('/api/v1/pots/', pots_etag)[0], 304)
+        self.assertEqual(get(brewer_url, brewer_etag)[0], 200)
+
+        self.add_pots(1)
+        self.assertEqual(get('/api/v1/pots/', pots_etag)[0], 200)
+
+    def test_tea_rendered_markdown(self):
+        """The html of the markdown fields is stored, served with ?render=html and backfilled."""
+        tea = Tea(name='Assam', category='black', description='*malty*')
+        db.session.add(tea)
+        db.session.commit()
+        tea_id = tea.id
+
+        def get(url):
+            response = self.client.get(url, headers=self.get_headers())
+            return response.status_code, json.loads(response.get_data(as_text=True))
+
+        status, data = get('/api/v1/teas/{}'.format(tea_id))
+        self.assertEqual(status, 200)
+        self.assertNotIn('description_html', data)
+        data = get('/api/v1/teas/{}?render=html'.format(tea_id))[1]
+        self.assertEqual(data['description_html'], '<p><em>malty</em></p>')
+        self.assertIsNone(data['tasting_notes_html'])
+        data = get('/api/v1/teas/?render=html')[1]
+        self.assertEqual(data['teas'][0]['description_html'], '<p><em>malty</em></p>')
+        self.assertEqual(get('/api/v1/teas/?render=pdf')[0], 400)
+
+        # a row written before the html columns existed
+        db.session.execute(Tea.__table__.update().values(description_html=None))
+        db.session.commit()
+        Tea.render_all_markdown()
+        self.assertEqual(Tea.query.get(tea_id).description_html, '<p><em>malty</em></p>')
+
+    def test_pots_fields_and_expand(self):
+        """?fields= trims the pots and ?expand= embeds their teas."""
+        self.add_pots(2)
+        response = self.client.get(
+            '/api/v1/pots/?fields=id,tea&expand=tea', headers=self.get_headers()
+        )
+        self.assertEqual(response.status_code, 200)
+        pot = json.loads(response.get_data(as_text=True))['pots'][0]
+        self.assertEqual(set(pot), {'id', 'tea'})
+        self.assertEqual(pot['tea']['category'], 'black')
+
+        response = self.client.get('/api/v1/pots/?fields=nope', headers=self.get_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_stats_by_endpoint(self):
+        """The statements of a request are counted against its endpoint."""
+        self.add_pots(2)
+        query_stats = self.app.extensions['query_stats']
+        query_stats.reset()
+        queries = self.count_queries('/api/v1/pots/')
+        stats = query_stats.stats()['api.get_pots']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['queries'], queries)
+
+    def test_metrics(self):
+        """/metrics counts the requests in the Prometheus text format."""
+        self.count_queries('/api/v1/pots/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn(
+            'teaflask_http_requests_total{endpoint="api.get_pots",method="GET",status="200"}', body
+        )
+        self.assertIn('teaflask_http_request_duration_seconds_bucket{endpoint="api.get_pots",le="+Inf"}', body)
+        self.client.get('/')
+        self.client.get('/')
+        body = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('teaflask_cache_hit_ratio{cache="status_pots"}', body)
+
+        # the file of a worker which has exited is reaped into the retired totals
+        import os
+        import subprocess
+        from .metrics import add_up
+        metrics = self.app.extensions['metrics']
+        process = subprocess.Popen(['true'])
+        process.wait()
+        data = dict(add_up([]), pid=process.pid, in_flight=1,
+                    requests=[['test.reaped', 'GET', '200', 5]])
+        path = os.path.join(metrics.path, '{}-dead.json'.format(process.pid))
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+        def reaped():
+            body = metrics.render()
+            self.assertIn('teaflask_http_requests_in_flight 0', body)
+            return [line for line in body.splitlines() if 'endpoint="test.reaped"' in line]
+
+        first = reaped()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(len(first), 1)
+        self.assertEqual(reaped(), first)
+
+    def test_bench(self):
+        """The bench seeds its dataset and reports every scenario."""
+        from . import bench
+        from .seed import dataset
+        bench.seed_dataset(teas=3, brewers=4, pots=50)
+        self.assertEqual(dataset(), {'teas': 3, 'brewers': 5, 'pots': 50})
+        results = bench.run_bench(self.app, requests=4, warmup=0)
+        self.assertEqual(set(results), {scenario[0] for scenario in bench.scenarios()})
+        for result in results.values():
+            self.assertLessEqual(result['p50'], result['p99'])
+        # a redirect where a page is expected, or a failed login, stops the bench
+        client = bench.TestClient(self.app)
+        with self.assertRaises(bench.BenchError):
+            bench.run_scenario([client], 'GET', '/logout', None, 200, 1)
+        brewer = Brewer.query.filter_by(username=bench.BENCH_USERNAME).first()
+        brewer.password = 'changed'
+        db.session.commit()
+        with self.assertRaises(bench.BenchError):
+            bench.log_in(client)
+
+    def test_tea_counters(self):
+        """Deleted pots are uncounted, the counters rebuild and sort the popular teas."""
+        from datetime import timedelta
+        self.add_pots(2)
+        tea_id, other_id = [tea.id for tea in Tea.query.order_by(Tea.id)]
+        pot = Pot.query.filter_by(tea_id=tea_id).first()
+        earlier = pot.brewed_at - timedelta(days=1)
+        db.session.add(Pot(tea_id=tea_id, brewer_id=pot.brewer_id, brewed_at=earlier))
+        db.session.commit()
+
+        def popular():
+            response = self.client.get('/api/v1/teas/?sort=popular', headers=self.get_headers())
+            data = json.loads(response.get_data(as_text=True))
+            return [int(tea['url'].rsplit('/', 1)[1]) for tea in data['teas']]
+
+        self.assertEqual(popular(), [tea_id, other_id])
+
+        # deleting the latest pot leaves the earlier one as the last brewed
+        db.session.delete(Pot.query.filter(Pot.tea_id == tea_id, Pot.brewed_at > earlier).one())
+        db.session.commit()
+        counters = db.session.query(Tea.id, Tea.pot_count, Tea.last_brewed_at).order_by(Tea.id).all()
+        self.assertEqual(counters[0][1:], (1, earlier))
+
+        db.session.execute(Tea.__table__.update().values(pot_count=0, last_brewed_at=None))
+        db.session.commit()
+        Tea.rebuild_counters()
+        self.assertEqual(
+            db.session.query(Tea.id, Tea.pot_count, Tea.last_brewed_at).order_by(Tea.id).all(),
+            counters
+        )
+        # equal counts are the newest tea first
+        self.assertEqual(popular(), [other_id, tea_id])
+
+    def test_pot_rollups(self):
+        """The rollups kept up as pots are written match a rebuild from the pots."""
+        from datetime import timedelta
+        from .models import POT_ROLLUPS
+        self.add_pots(3)
+        pot = Pot.query.first()
+        pot.drank_at = pot.brewed_at + timedelta(minutes=10)
+        db.session.commit()
+        # moving a pot to another tea and day moves it between the rollup rows
+        pots = Pot.query.order_by(Pot.id).all()
+        pots[1].tea_id = pots[2].tea_id
+        pots[1].brewed_at -= timedelta(days=2)
+        db.session.commit()
+
+        def rows(rollup):
+            return sorted(
+                (r.bucket, r.tea_id, r.brewer_id, r.brewed, r.drank, round(r.drink_seconds))
+                for r in rollup.query if r.brewed or r.drank
+            )
+
+        for rollup in POT_ROLLUPS.values():
+            kept = rows(rollup)
+            rollup.rebuild()
+            self.assertEqual(kept, rows(rollup))
+            rollup.rebuild(portable=True)
+            self.assertEqual(kept, rows(rollup))
+
+        response = self.client.get('/api/v1/stats/pots?bucket=day&total=1', headers=self.get_headers())
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.get_data(as_text=True))['stats']
+        self.assertEqual(stats, [{'brewed': 3, 'drank': 1, 'mean_drink_seconds': 600.0}])
+        response = self.client.get('/api/v1/stats/pots?tea_id=abc', headers=self.get_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_pots_filters(self):
+        """The pot listings filter by brewed_at and drinkable, and keep the filters in the links."""
+        self.add_pots(3)
+        pot = Pot.query.first()
+        pot.drank_at = pot.brewed_at
+        db.session.commit()
+
+        def get(url):
+            response = self.client.get(url, headers=self.get_headers())
+            return response.status_code, json.loads(response.get_data(as_text=True))
+
+        status, data = get('/api/v1/pots/?drinkable=true&limit=1')
+        self.assertEqual(status, 200)
+        self.assertEqual(data['count'], 2)
+        self.assertIn('drinkable=true', data['next'])
+        self.assertEqual(get('/api/v1/pots/?since=2100-01-01')[1]['count'], 0)
+        self.assertEqual(get('/api/v1/pots/?until=2100-01-01')[1]['count'], 3)
+        self.assertEqual(get('/api/v1/pots/?drinkable=maybe')[0], 400)
+
+    def test_leaderboard(self):
+        """The leaderboard ranks the brewers and moves them up as they brew."""
+        self.add_pots(2)
+        brewer = Brewer.query.filter_by(username='brewer').first()
+        tea = Tea.query.first()
+        db.session.add(Pot(tea=tea, brewer=brewer))
+        db.session.commit()
+
+        def board():
+            response = self.client.get('/api/v1/brewers/leaderboard?window=7d', headers=self.get_headers())
+            self.assertEqual(response.status_code, 200)
+            return [
+                (entry['username'], entry['pots'])
+                for entry in json.loads(response.get_data(as_text=True))['brewers']
+            ]
+
+        self.assertEqual(board(), [('brewer', 1), ('brewer0', 1), ('brewer1', 1)])
+        brewer1 = Brewer.query.filter_by(username='brewer1').first()
+        db.session.add_all([Pot(tea=tea, brewer=brewer1), Pot(tea=tea, brewer=brewer1)])
+        db.session.commit()
+        self.assertEqual(board(), [('brewer1', 3), ('brewer', 1), ('brewer0', 1)])
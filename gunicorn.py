@@ -10,3 +10,10 @@ chdir = '/opt/app/'
 graceful_timeout = 10
 worker_class = 'eventlet'
 workers = 2
+
+
+def post_fork(server, worker):
+    """Make psycopg2 wait cooperatively in the eventlet workers."""
+    if worker_class == 'eventlet':
+        from app.green import patch_psycopg2
+        patch_psycopg2()
@@ -3,9 +3,10 @@
 """Django like manage.py ."""
 
 import os
+import sys
 from app import create_app, db
-from app.models import Pot, Brewer, Tea, Permission
-from flask.ext.script import Manager, Shell
+from app.models import DATE_FORMAT, Pot, Brewer, Tea, Permission
+from flask.ext.script import Command, Manager, Shell
 from flask.ext.migrate import Migrate, MigrateCommand
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
@@ -54,6 +55,180 @@ def profile(length=25, profile_dir=None):
     app.run()
 
 
+def _explain(query):
+    """Return the rows of the backend's query plan for an ORM query."""
+    engine = db.engine
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    compiled = query.statement.compile(dialect=engine.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return engine.execute(prefix + str(compiled), params).fetchall()
+
+
+@manager.command
+def explain():
+    """Print the query plans of the queries behind the main endpoints."""
+    from datetime import datetime
+    from app.api_1_0.pagination import after, ordered
+    per_page = app.config['TEAFLASK_PER_PAGE']
+    order_by = (Pot.brewed_at, Pot.id)
+    queries = [
+        ('main.index pot', Pot.query.filter_by(drank_at=None).order_by(Pot.brewed_at.desc()).limit(1)),
+        ('main.index pots', Pot.query.order_by(Pot.brewed_at.desc()).limit(10)),
+        ('api.get_pots', ordered(Pot.query, order_by, True).limit(per_page)),
+        ('api.get_pots cursor', ordered(
+            Pot.query.filter(after(order_by, (datetime.utcnow(), 0), True)),
+            order_by,
+            True
+        ).limit(per_page)),
+        ('api.get_pots since', ordered(
+            Pot.query.filter(Pot.brewed_at >= datetime.utcnow()), order_by, True
+        ).limit(per_page)),
+        ('api.get_pots drinkable', ordered(
+            Pot.query.filter(Pot.drank_at == None), order_by, True  # NOQA
+        ).limit(per_page)),
+        ('api.get_tea_pots', ordered(Pot.query.filter_by(tea_id=1), order_by, True).limit(per_page)),
+        ('api.get_brewer_pots', ordered(Pot.query.filter_by(brewer_id=1), order_by, True).limit(per_page)),
+    ]
+    for name, query in queries:
+        print(name)
+        for row in _explain(query):
+            print('    ' + ' '.join(str(column) for column in row))
+
+
+def rebuild_counters():
+    """Recount the maintained pot counters of the teas."""
+    Tea.rebuild_counters()
+
+
+def rebuild_rollups():
+    """Recount the hourly and daily pot rollups from the pots."""
+    from app.models import POT_ROLLUPS
+    for rollup in POT_ROLLUPS.values():
+        rollup.rebuild()
+
+
+def export_pots(format='ndjson', since=None, until=None, output=None):
+    """Write every pot to output, or stdout, as ndjson or csv."""
+    import sys
+    from app.api_1_0.export import FORMATS, export_pots as _export_pots
+    from app.api_1_0.filters import time_range
+    if format not in FORMATS:
+        raise SystemExit('format must be one of ' + ', '.join(sorted(FORMATS)))
+    since, until = time_range({'since': since, 'until': until})
+    stream = open(output, 'w', newline='') if output else sys.stdout
+    try:
+        for chunk in _export_pots(format, since, until):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+
+
+def render_markdown():
+    """Render the html of the markdown fields of every tea."""
+    Tea.render_all_markdown()
+
+
+def bench_json(items=100, rounds=1000):
+    """Compare the JSON encoders on the payload of /api/v1/pots/?limit=100."""
+    from datetime import datetime, timedelta
+    from timeit import timeit
+    from flask import json
+    from app.api_1_0 import encoding
+    from app.models import Role
+    items, rounds = int(items), int(rounds)
+    role = Role(id=1, name='User')
+    with app.test_request_context('/api/v1/pots/'):
+        pots = []
+        for i in range(1, items + 1):
+            tea = Tea(id=i, name='Tea {}'.format(i))
+            brewer = Brewer(id=i, username='brewer{}'.format(i), role=role)
+            brewed_at = datetime(2015, 10, 19) + timedelta(minutes=i)
+            pots.append(Pot(
+                id=i, tea_id=i, brewer_id=i, tea=tea, brewer=brewer,
+                brewed_at=brewed_at, drank_at=brewed_at + timedelta(minutes=30)
+            ))
+        payload = {'pots': [pot.to_json() for pot in pots], 'prev': None, 'next': None}
+
+        def preformatted():
+            # the old path: dates formatted in to_json, then flask's encoder
+            data = dict(payload, pots=[
+                {k: v.strftime(DATE_FORMAT) if isinstance(v, datetime) else v for k, v in pot.items()}
+                for pot in payload['pots']
+            ])
+            return json.dumps(data, indent=2)
+
+        cases = [('flask jsonify, indented', preformatted)]
+        backends = ['json'] + (['orjson'] if encoding.orjson is not None else [])
+        for backend in backends:
+            for indent in (True, False):
+                cases.append((
+                    '{}{}'.format(backend, ', indented' if indent else ''),
+                    lambda backend=backend, indent=indent: encoding.dumps(payload, indent, backend)
+                ))
+        for name, case in cases:
+            seconds = timeit(case, number=rounds)
+            print('{:<28} {:>10.0f} payloads/s'.format(name, rounds / seconds))
+
+
+@manager.command
+def seed(teas=200, brewers=5000, pots=10000000, years=5, seed=0, workers=None):
+    """
+    Fill an empty database with generated teas, brewers and pots.
+
+    Every brewer's password is their username.
+    """
+    import time
+    from app.seed import dataset, seed_database
+    if Pot.query.first() or Tea.query.first():
+        raise SystemExit('The database already has teas or pots')
+    start = time.time()
+    seed_database(
+        int(teas), int(brewers), int(pots), int(years), int(seed),
+        workers=int(workers) if workers else None
+    )
+    print('Added {teas} teas, {brewers} brewers and {pots} pots'.format(**dataset()),
+          'in {:.0f}s'.format(time.time() - start))
+
+
+@manager.command
+def bench(teas=50, brewers=200, pots=100000, requests=200, concurrency=1, warmup=10,
+          seed=0, url=None, output=None):
+    """
+    Benchmark the hot endpoints and print the results as JSON.
+
+    An empty database is first seeded with the teas, brewers and pots, an
+    existing dataset is reused. Run against a database of its own, for
+    example with FLASK_CONFIG=testing. The POST scenarios add pots. With
+    --url the requests go to a running server instead of the test client.
+    """
+    import json
+    from app import bench as _bench
+    from app.seed import dataset
+    if not Pot.query.first():
+        _bench.seed_dataset(int(teas), int(brewers), int(pots), int(seed))
+    try:
+        scenarios = _bench.run_bench(app, url, int(requests), int(concurrency), int(warmup))
+    except _bench.BenchError as e:
+        raise SystemExit(e)
+    results = {
+        'commit': _bench.commit(),
+        'target': url or 'in-process',
+        'concurrency': int(concurrency),
+        'dataset': dataset(),
+        'scenarios': scenarios,
+    }
+    stream = open(output, 'w') if output else sys.stdout
+    try:
+        json.dump(results, stream, indent=2, sort_keys=True)
+        stream.write('\n')
+    finally:
+        if output:
+            stream.close()
+
+
 @manager.command
 def deploy():
     """Run deployment tasks."""
@@ -70,5 +245,13 @@ def deploy():
     # User.add_self_follows()
 
 
+# commands with a dash in their name
+manager.add_command('rebuild-counters', Command(rebuild_counters))
+manager.add_command('export-pots', Command(export_pots))
+manager.add_command('render-markdown', Command(render_markdown))
+manager.add_command('bench-json', Command(bench_json))
+manager.add_command('rebuild-rollups', Command(rebuild_rollups))
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,52 @@
+"""
+Indexes for the pots access paths.
+
+Revision ID: 1b8d2c6f4a7
+Revises: 59e6d1acd9c
+Create Date: 2026-10-18 09:12:41.503127
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1b8d2c6f4a7'
+down_revision = '59e6d1acd9c'
+
+
+INDEXES = (
+    # the status screen: the newest pot that is not drank yet
+    ('ix_pots_undrunk_brewed_at', ['drank_at', 'brewed_at'], 'drank_at IS NULL'),
+    # recent pots and the api collections, ordered by (brewed_at, id)
+    ('ix_pots_brewed_at_id', ['brewed_at', 'id'], None),
+    ('ix_pots_tea_id_brewed_at_id', ['tea_id', 'brewed_at', 'id'], None),
+    ('ix_pots_brewer_id_brewed_at_id', ['brewer_id', 'brewed_at', 'id'], None),
+)
+
+
+def _is_postgresql():
+    return not op.get_context().as_sql and op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    """Build the indexes, without locking pots against writes on PostgreSQL."""
+    if _is_postgresql():
+        # CREATE INDEX CONCURRENTLY cannot run inside the migration transaction
+        op.execute('COMMIT')
+        for name, columns, where in INDEXES:
+            op.execute('CREATE INDEX CONCURRENTLY {} ON pots ({}){}'.format(
+                name,
+                ', '.join(columns),
+                ' WHERE ' + where if where else ''
+            ))
+        return
+
+    # elsewhere the undrunk index is a full index led by drank_at
+    for name, columns, where in INDEXES:
+        op.create_index(name, 'pots', columns, unique=False)
+
+
+def downgrade():
+    """Drop the indexes."""
+    for name, columns, where in reversed(INDEXES):
+        op.drop_index(name, table_name='pots')
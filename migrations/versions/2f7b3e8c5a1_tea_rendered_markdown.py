@@ -0,0 +1,32 @@
+"""
+Rendered html of the tea markdown fields.
+
+Run manage.py render-markdown after upgrading to fill in the existing teas,
+until then the tea page renders their markdown on every view.
+
+Revision ID: 2f7b3e8c5a1
+Revises: 4c2e9a7d1f3
+Create Date: 2026-10-18 10:48:53.902164
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7b3e8c5a1'
+down_revision = '4c2e9a7d1f3'
+
+
+def upgrade():
+    """Add the html columns."""
+    op.add_column('teas', sa.Column('description_html', sa.Text(), nullable=True))
+    op.add_column('teas', sa.Column('brewing_methods_html', sa.Text(), nullable=True))
+    op.add_column('teas', sa.Column('tasting_notes_html', sa.Text(), nullable=True))
+
+
+def downgrade():
+    """Drop the html columns."""
+    op.drop_column('teas', 'tasting_notes_html')
+    op.drop_column('teas', 'brewing_methods_html')
+    op.drop_column('teas', 'description_html')
@@ -0,0 +1,32 @@
+"""
+Maintained pot counters on teas.
+
+Revision ID: 4c2e9a7d1f3
+Revises: 1b8d2c6f4a7
+Create Date: 2026-10-18 10:02:17.114690
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2e9a7d1f3'
+down_revision = '1b8d2c6f4a7'
+
+
+def upgrade():
+    """Add the columns and count the pots brewed so far."""
+    op.add_column('teas', sa.Column('pot_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('teas', sa.Column('last_brewed_at', sa.DateTime(), nullable=True))
+    op.execute(
+        'UPDATE teas SET '
+        'pot_count = (SELECT count(pots.id) FROM pots WHERE pots.tea_id = teas.id), '
+        'last_brewed_at = (SELECT max(pots.brewed_at) FROM pots WHERE pots.tea_id = teas.id)'
+    )
+
+
+def downgrade():
+    """Drop the columns."""
+    op.drop_column('teas', 'last_brewed_at')
+    op.drop_column('teas', 'pot_count')
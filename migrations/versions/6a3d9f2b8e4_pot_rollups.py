@@ -0,0 +1,40 @@
+"""
+Hourly and daily rollups of the pots.
+
+Run manage.py rebuild-rollups after upgrading to count the existing pots.
+
+Revision ID: 6a3d9f2b8e4
+Revises: 2f7b3e8c5a1
+Create Date: 2026-10-18 14:21:06.337815
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a3d9f2b8e4'
+down_revision = '2f7b3e8c5a1'
+
+TABLES = ('pot_rollups_hourly', 'pot_rollups_daily')
+
+
+def upgrade():
+    """Create the rollup tables."""
+    for table in TABLES:
+        op.create_table(
+            table,
+            sa.Column('bucket', sa.DateTime(), nullable=False),
+            sa.Column('tea_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('brewer_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('brewed', sa.Integer(), server_default='0', nullable=False),
+            sa.Column('drank', sa.Integer(), server_default='0', nullable=False),
+            sa.Column('drink_seconds', sa.Float(), server_default='0', nullable=False),
+            sa.PrimaryKeyConstraint('bucket', 'tea_id', 'brewer_id')
+        )
+
+
+def downgrade():
+    """Drop the rollup tables."""
+    for table in reversed(TABLES):
+        op.drop_table(table)